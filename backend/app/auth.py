@@ -1,21 +1,28 @@
+import asyncio
 from datetime import datetime, timedelta
 from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from sqlalchemy.orm import Session
+from sqlalchemy import select, event, inspect
+from sqlalchemy.ext.asyncio import AsyncSession
 from .database import get_db
 from .models import Admin
 from .config import get_settings
+from .services.ttl_cache import TTLCache
 import pyotp
 
 settings = get_settings()
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 security = HTTPBearer()
 
+# Resolved admins by email (the token subject); detached, read-only instances
+admin_cache = TTLCache(settings.admin_cache_size, settings.admin_cache_ttl_seconds)
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    """bcrypt is deliberately slow (~100s of ms), so it runs off the event loop"""
+    return await asyncio.to_thread(pwd_context.verify, plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
@@ -47,7 +54,7 @@ def verify_token(token: str) -> dict:
 
 async def get_current_admin(
     credentials: HTTPAuthorizationCredentials = Depends(security),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ) -> Admin:
     token = credentials.credentials
     payload = verify_token(token)
@@ -57,15 +64,30 @@ async def get_current_admin(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid authentication credentials",
         )
-    admin = db.query(Admin).filter(Admin.email == email).first()
+    admin = admin_cache.get(email)
+    if admin is not None:
+        return admin
+
+    result = await db.execute(select(Admin).where(Admin.email == email))
+    admin = result.scalars().first()
     if admin is None:
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Admin not found",
         )
+    admin_cache.set(email, admin)
     return admin
 
 
+@event.listens_for(Admin, 'after_update')
+@event.listens_for(Admin, 'after_delete')
+def _invalidate_cached_admin(mapper, connection, target: Admin):
+    """Drop a changed admin (role, 2FA, email, ...) so the next request reloads it"""
+    admin_cache.pop(target.email)
+    for old_email in inspect(target).attrs.email.history.deleted:
+        admin_cache.pop(old_email)
+
+
 async def get_current_admin_with_role(required_role: str = None):
     async def role_checker(admin: Admin = Depends(get_current_admin)) -> Admin:
         if required_role and admin.role != required_role and admin.role != 'admin':
@@ -24,6 +24,10 @@ class Settings(BaseSettings):
     # OpenAI
     openai_api_key: str
 
+    # Outbound API clients (AWS, OpenAI, Stripe), shared per worker
+    client_pool_size: int = 50
+    client_timeout_seconds: float = 30
+
     # Google Cloud
     google_application_credentials: str | None = None
 
@@ -32,9 +36,45 @@ class Settings(BaseSettings):
     grid_height: int = 1000
     min_block_size: int = 10
     default_price_per_pixel: float = 1.00
+    pricing_refresh_seconds: int = 300
+
+    # Reservations
+    reservation_hold_minutes: int = 15
+    # Stripe Checkout sessions expire after this; a draft with an open session keeps its hold (Stripe minimum: 30)
+    checkout_session_minutes: int = 30
+    reservation_lock_chunk_size: int = 50
+    reservation_sweep_seconds: int = 60
+    reservation_expiry_batch: int = 500
     max_image_size_mb: int = 5
+    max_image_pixels: int = 40_000_000
+    image_workers: int = 2
     frontend_url: str = "http://localhost:3000"
 
+    # Grid tiles
+    tile_size: int = 256
+
+    # Grid change feed
+    grid_change_retention: int = 1000
+    grid_stream_queue_size: int = 100
+    grid_stream_heartbeat_seconds: int = 15
+
+    # Moderation
+    moderation_workers: int = 4
+    moderation_job_retention: int = 1000
+    moderation_shutdown_seconds: int = 30
+    banned_refresh_seconds: int = 300
+    perceptual_hash_max_distance: int = 6
+    moderation_cache_size: int = 10000
+    moderation_cache_ttl_seconds: int = 3600
+    audit_export_batch_size: int = 1000
+    admin_cache_size: int = 256
+    admin_cache_ttl_seconds: int = 60
+
+    # Response compression (brotli only when the brotli package is installed)
+    compression_minimum_size: int = 1024
+    compression_gzip_level: int = 6
+    compression_brotli_quality: int = 4
+
     # Testing
     test_mode_enabled: bool = True
     test_mode_ips: list[str] = ["127.0.0.1", "::1", "localhost"]
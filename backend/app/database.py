@@ -1,25 +1,39 @@
-from sqlalchemy import create_engine
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import sessionmaker
 from .config import get_settings
 
 settings = get_settings()
 
-engine = create_engine(
-    settings.database_url,
+# SQLSTATE raised when a row breaks an EXCLUDE constraint (e.g. overlapping blocks)
+EXCLUSION_VIOLATION = '23P01'
+
+
+def async_database_url(url: str) -> str:
+    """Point a plain postgresql:// URL at the asyncpg driver"""
+    for prefix in ('postgresql+psycopg2://', 'postgresql://', 'postgres://'):
+        if url.startswith(prefix):
+            return 'postgresql+asyncpg://' + url[len(prefix):]
+    return url
+
+
+engine = create_async_engine(
+    async_database_url(settings.database_url),
     pool_pre_ping=True,
     pool_size=10,
     max_overflow=20
 )
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+# Objects stay usable after commit; async sessions cannot lazy-load expired attributes
+SessionLocal = async_sessionmaker(engine, class_=AsyncSession, autoflush=False, expire_on_commit=False)
 
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+
+def is_exclusion_violation(error: IntegrityError) -> bool:
+    return getattr(error.orig, 'sqlstate', None) == EXCLUSION_VIOLATION
@@ -1,17 +1,89 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse
 from fastapi.middleware.cors import CORSMiddleware
 from .routers import admin, blocks, moderation, payments
+from .middleware import UploadSizeLimitMiddleware, CompressionMiddleware
 from .config import get_settings
+from .database import SessionLocal, engine
+from .services.occupancy import occupancy_index
+from .services.tiles import tile_service
+from .services.grid_hub import grid_hub
+from .services.moderation_jobs import moderation_pool
+from .services.banned_matcher import banned_matcher
+from .services.pricing import pricing_service
+from .services.image_processing import image_pool
+from .services.clients import client_registry
+from .services.reservations import reservation_holds
 
 settings = get_settings()
 
+
+def _close_streams_on_exit():
+    """
+    Uvicorn only runs lifespan shutdown once every response has finished, and
+    SSE streams never finish on their own, so end them as soon as it is told to exit.
+    Wrapped at import time because uvicorn binds handle_exit to its signals before startup.
+    """
+    try:
+        from uvicorn.server import Server
+    except ImportError:
+        return
+
+    handle_exit = Server.handle_exit
+    if getattr(handle_exit, 'closes_grid_streams', False):
+        return
+
+    def close_streams_then_exit(self, sig, frame):
+        grid_hub.close()
+        handle_exit(self, sig, frame)
+
+    close_streams_then_exit.closes_grid_streams = True
+    Server.handle_exit = close_streams_then_exit
+
+
+_close_streams_on_exit()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    client_registry.start()
+    # Warm in-memory grid state before serving traffic
+    async with SessionLocal() as db:
+        await occupancy_index.rebuild(db)
+        await banned_matcher.rebuild(db)
+        await pricing_service.rebuild(db)
+        await tile_service.start(db)
+        await reservation_holds.start(db)
+        # Re-queues moderation of uploads whose jobs were lost in the last shutdown
+        await moderation_pool.start(db)
+    grid_hub.start()
+    image_pool.start()
+    yield
+    grid_hub.close()
+    await reservation_holds.stop()
+    await moderation_pool.stop()
+    image_pool.stop()
+    tile_service.stop()
+    client_registry.close()
+    await engine.dispose()
+
+
 app = FastAPI(
     title="BloxGrid API",
     description="Modern pixel grid marketplace with Roblox aesthetics",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan,
+    default_response_class=ORJSONResponse
 )
 
-# CORS
+# Cap image uploads while they stream in
+app.add_middleware(UploadSizeLimitMiddleware, max_bytes=settings.max_image_size_mb * 1024 * 1024)
+
+# Compress JSON/CSV bodies (brotli or gzip)
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_minimum_size)
+
+# CORS (added last so it also wraps early rejections)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=[settings.frontend_url, "http://localhost:3000"],
@@ -0,0 +1,124 @@
+from fastapi import HTTPException
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers, MutableHeaders
+from .services.compression import Compressor, negotiate_encoding
+
+# Room for the non-file form fields (edit token, link, hover text) and multipart framing
+FORM_OVERHEAD_BYTES = 64 * 1024
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Caps the request body of image upload routes while it streams in.
+
+    Starlette spools multipart bodies to a temporary file before the handler
+    runs, so a size check in the handler comes too late. Requests announcing
+    a larger Content-Length are refused outright; chunked or lying clients
+    are cut off as soon as the running total crosses the cap.
+    """
+
+    def __init__(self, app, max_bytes: int, path_suffix: str = '/upload'):
+        self.app = app
+        self.max_bytes = max_bytes + FORM_OVERHEAD_BYTES
+        self.path_suffix = path_suffix
+        self.detail = f"Image too large (max {max_bytes // (1024 * 1024)}MB)"
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or scope['method'] != 'POST' or not scope['path'].endswith(self.path_suffix):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope['headers'])
+        content_length = headers.get(b'content-length')
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            response = JSONResponse({'detail': self.detail}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message['type'] == 'http.request':
+                received += len(message.get('body', b''))
+                if received > self.max_bytes:
+                    # Raised inside body parsing, so FastAPI turns it into a normal 413 response
+                    raise HTTPException(status_code=413, detail=self.detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+class CompressionMiddleware:
+    """
+    Compresses response bodies with brotli or gzip, whichever the client
+    prefers among those available.
+
+    Single-message bodies under minimum_size are sent as is, since framing
+    would cost more than it saves. Streamed bodies are encoded chunk by
+    chunk. Responses that are already encoded (e.g. the pre-compressed grid
+    snapshot), images and server-sent event streams pass through untouched.
+    """
+
+    SKIP_CONTENT_TYPES = ('image/', 'text/event-stream')
+
+    def __init__(self, app, minimum_size: int = 1024):
+        self.app = app
+        self.minimum_size = minimum_size
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http':
+            await self.app(scope, receive, send)
+            return
+
+        encoding = negotiate_encoding(Headers(scope=scope).get('accept-encoding', ''))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+
+        start_message = None
+        compressor: Compressor | None = None
+        passthrough = False
+
+        async def compressing_send(message):
+            nonlocal start_message, compressor, passthrough
+            if message['type'] == 'http.response.start':
+                start_message = message
+                return
+            if message['type'] != 'http.response.body' or passthrough:
+                await send(message)
+                return
+
+            body = message.get('body', b'')
+            more_body = message.get('more_body', False)
+
+            if compressor is None:
+                headers = MutableHeaders(raw=start_message['headers'])
+                if ('content-encoding' in headers
+                        or headers.get('content-type', '').startswith(self.SKIP_CONTENT_TYPES)
+                        or (not more_body and len(body) < self.minimum_size)):
+                    passthrough = True
+                    await send(start_message)
+                    await send(message)
+                    return
+
+                compressor = Compressor(encoding)
+                headers['Content-Encoding'] = encoding
+                headers.add_vary_header('Accept-Encoding')
+                if more_body:
+                    del headers['Content-Length']
+                else:
+                    body = compressor.compress(body) + compressor.finish()
+                    headers['Content-Length'] = str(len(body))
+                    await send(start_message)
+                    await send({'type': 'http.response.body', 'body': body})
+                    return
+                await send(start_message)
+
+            body = compressor.compress(body)
+            if not more_body:
+                body += compressor.finish()
+            await send({'type': 'http.response.body', 'body': body, 'more_body': more_body})
+
+        await self.app(scope, receive, compressing_send)
@@ -1,6 +1,6 @@
 from sqlalchemy import Column, String, Integer, Boolean, TIMESTAMP, Numeric, Text, ARRAY, ForeignKey, CheckConstraint, Computed
-from sqlalchemy.dialects.postgresql import UUID, JSONB
-from sqlalchemy.orm import relationship
+from sqlalchemy.dialects.postgresql import UUID, JSONB, INT4RANGE, ExcludeConstraint
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.sql import func
 import uuid
 from .database import Base
@@ -31,6 +31,9 @@ class Block(Base):
     width = Column(Integer, nullable=False)
     height = Column(Integer, nullable=False)
     pixel_count = Column(Integer, Computed("width * height"), nullable=False)
+    # Half-open pixel ranges for GiST overlap queries; deferred since the API never returns them
+    x_range = deferred(Column(INT4RANGE, Computed("int4range(x_start, x_start + width)")))
+    y_range = deferred(Column(INT4RANGE, Computed("int4range(y_start, y_start + height)")))
     price_paid = Column(Numeric(10, 2), nullable=False)
     buyer_email = Column(String(255), nullable=True)
     link_url = Column(String(500))
@@ -49,7 +52,13 @@ class Block(Base):
     __table_args__ = (
         CheckConstraint('width >= 10 AND width % 10 = 0', name='check_width'),
         CheckConstraint('height >= 10 AND height % 10 = 0', name='check_height'),
-        CheckConstraint("status IN ('draft', 'pending_review', 'approved', 'rejected', 'removed_after_publish')", name='check_status'),
+        CheckConstraint("status IN ('draft', 'pending_review', 'approved', 'rejected', 'removed_after_publish', 'expired')", name='check_status'),
+        ExcludeConstraint(
+            ('x_range', '&&'), ('y_range', '&&'),
+            name='no_overlapping_active_blocks',
+            using='gist',
+            where="status IN ('pending_review', 'approved')"
+        ),
     )
 
 
@@ -59,7 +68,9 @@ class BlockImage(Base):
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
     block_id = Column(UUID(as_uuid=True), ForeignKey('blocks.id', ondelete='CASCADE'), nullable=False)
     image_url = Column(String(500), nullable=False)
+    image_variants = Column(JSONB)
     image_hash = Column(String(64), nullable=False)
+    perceptual_hash = Column(String(16))
     link_url = Column(String(500), nullable=False)
     hover_title = Column(String(100))
     hover_description = Column(String(255))
@@ -1,25 +1,31 @@
-from fastapi import APIRouter, Depends, HTTPException, status
-from sqlalchemy.orm import Session
-from datetime import timedelta
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select, tuple_
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
 from ..database import get_db
 from ..models import Admin, AdminAction
-from ..schemas import AdminLogin, AdminToken, AdminResponse
+from ..schemas import AdminLogin, AdminToken, AdminResponse, AdminActionPage
 from ..auth import verify_password, create_access_token, get_current_admin, get_password_hash
 from ..config import get_settings
+from ..services.pagination import encode_cursor, decode_cursor
+from ..services.audit_export import stream_admin_actions, EXPORT_FORMATS
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 settings = get_settings()
 
 
 @router.post("/login", response_model=AdminToken)
-async def login(credentials: AdminLogin, db: Session = Depends(get_db)):
+async def login(credentials: AdminLogin, db: AsyncSession = Depends(get_db)):
     """
     Admin login endpoint - HIDDEN, no public signup
     Only accessible via direct URL (/admin/login)
     """
-    admin = db.query(Admin).filter(Admin.email == credentials.email).first()
+    result = await db.execute(select(Admin).where(Admin.email == credentials.email))
+    admin = result.scalars().first()
 
-    if not admin or not verify_password(credentials.password, admin.password_hash):
+    if not admin or not await verify_password(credentials.password, admin.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
@@ -27,8 +33,8 @@ async def login(credentials: AdminLogin, db: Session = Depends(get_db)):
         )
 
     # Update last login
-    admin.last_login = db.query(Admin).filter(Admin.id == admin.id).first().last_login
-    db.commit()
+    admin.last_login = datetime.utcnow()
+    await db.commit()
 
     access_token_expires = timedelta(minutes=settings.access_token_expire_minutes)
     access_token = create_access_token(
@@ -45,13 +51,90 @@ async def get_current_admin_info(admin: Admin = Depends(get_current_admin)):
     return admin
 
 
-@router.get("/actions")
+def _naive_utc(value: datetime) -> datetime:
+    """created_at is TIMESTAMP WITHOUT TIME ZONE in UTC; asyncpg refuses aware datetimes for it"""
+    if value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+
+def _action_filters(
+    action_type: str | None,
+    admin_id: UUID | None,
+    target_type: str | None,
+    target_id: UUID | None,
+    since: datetime | None,
+    until: datetime | None
+) -> list:
+    conditions = []
+    if action_type is not None:
+        conditions.append(AdminAction.action_type == action_type)
+    if admin_id is not None:
+        conditions.append(AdminAction.admin_id == admin_id)
+    if target_type is not None:
+        conditions.append(AdminAction.target_type == target_type)
+    if target_id is not None:
+        conditions.append(AdminAction.target_id == target_id)
+    if since is not None:
+        conditions.append(AdminAction.created_at >= _naive_utc(since))
+    if until is not None:
+        conditions.append(AdminAction.created_at < _naive_utc(until))
+    return conditions
+
+
+@router.get("/actions", response_model=AdminActionPage)
 async def get_admin_actions(
-    skip: int = 0,
-    limit: int = 50,
+    cursor: str | None = None,
+    limit: int = Query(50, ge=1, le=500),
+    action_type: str | None = None,
+    admin_id: UUID | None = None,
+    target_type: str | None = None,
+    target_id: UUID | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
     admin: Admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
+):
+    """Get admin action history (audit log), newest first"""
+    query = select(AdminAction).where(
+        *_action_filters(action_type, admin_id, target_type, target_id, since, until)
+    )
+
+    if cursor:
+        try:
+            created_at, action_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(AdminAction.created_at, AdminAction.id) < tuple_(created_at, action_id))
+
+    result = await db.execute(
+        query.order_by(AdminAction.created_at.desc(), AdminAction.id.desc()).limit(limit + 1)
+    )
+    actions = result.scalars().all()
+
+    next_cursor = None
+    if len(actions) > limit:
+        actions = actions[:limit]
+        next_cursor = encode_cursor(actions[-1].created_at, actions[-1].id)
+
+    return {"items": actions, "next_cursor": next_cursor}
+
+
+@router.get("/actions/export")
+async def export_admin_actions(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$"),
+    action_type: str | None = None,
+    admin_id: UUID | None = None,
+    target_type: str | None = None,
+    target_id: UUID | None = None,
+    since: datetime | None = None,
+    until: datetime | None = None,
+    admin: Admin = Depends(get_current_admin)
 ):
-    """Get admin action history (audit log)"""
-    actions = db.query(AdminAction).order_by(AdminAction.created_at.desc()).offset(skip).limit(limit).all()
-    return actions
+    """Stream the full (filtered) audit log, oldest first, as NDJSON or CSV"""
+    conditions = _action_filters(action_type, admin_id, target_type, target_id, since, until)
+    return StreamingResponse(
+        stream_admin_actions(conditions, format),
+        media_type=EXPORT_FORMATS[format],
+        headers={"Content-Disposition": f'attachment; filename="admin-actions.{format}"'}
+    )
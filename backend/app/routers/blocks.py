@@ -1,91 +1,187 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from sqlalchemy.orm import Session
-from sqlalchemy import and_, or_
+from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form, Query, Request, Response
+from fastapi.responses import StreamingResponse
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List
+import asyncio
 import secrets
+import numpy as np
 from uuid import UUID
 from ..database import get_db
-from ..models import Block, BlockImage, GridRegion, BannedContent
+from ..models import Block, BlockImage, BannedContent, ModerationCheck
 from ..schemas import (
     BlockCreate, BlockResponse, BlockImageUpload, GridAvailabilityCheck,
-    GridAvailabilityResponse, BlockImageResponse, GridBlockResponse
+    GridAvailabilityResponse, GridBlockResponse, GridChangesResponse,
+    ModerationJobResponse, GridAvailabilityBatchCheck, GridAvailabilityBatchResponse,
+    FreeSpaceResponse, LargestFreeRectangleResponse
 )
-from ..services.storage import StorageService
-from ..services.moderation import ModerationService
+from ..services.moderation_jobs import moderation_pool
+from ..services.upload_pipeline import UploadPipeline, UploadRejected
+from ..services.occupancy import occupancy_index
+from ..services.free_space import find_positions, largest_empty_rectangle
+from ..services.pricing import pricing_service
+from ..services.reservations import lock_area, find_overlapping, reservation_holds
+from ..services.tiles import tile_service
+from ..services.grid_snapshot import grid_snapshot_cache
+from ..services.grid_changes import grid_change_log
+from ..services.grid_events import block_reserved
+from ..services.grid_hub import grid_hub
+from ..services.compression import negotiate_encoding
 from ..config import get_settings
 
 router = APIRouter(prefix="/blocks", tags=["blocks"])
 settings = get_settings()
 
 
-def check_grid_availability(db: Session, x_start: int, y_start: int, width: int, height: int) -> tuple[bool, list]:
-    """Check if grid area is available"""
-    x_end = x_start + width
-    y_end = y_start + height
-
-    # Check for overlapping blocks
-    conflicting = db.query(Block).filter(
-        Block.status.in_(['approved', 'pending_review']),
-        or_(
-            and_(
-                Block.x_start < x_end,
-                Block.x_start + Block.width > x_start,
-                Block.y_start < y_end,
-                Block.y_start + Block.height > y_start
-            )
-        )
-    ).all()
+def check_grid_availability(x_start: int, y_start: int, width: int, height: int) -> tuple[bool, list[UUID]]:
+    """Check if grid area is available (served from the in-memory occupancy index)"""
+    conflicting_ids = occupancy_index.conflicts(x_start, y_start, width, height)
+    return len(conflicting_ids) == 0, conflicting_ids
 
-    return len(conflicting) == 0, conflicting
 
+def fits_grid(rects: np.ndarray) -> np.ndarray:
+    """Mask of (x, y, w, h) rows reserve_block would accept: inside the grid and aligned to min_block_size"""
+    return (
+        (rects % settings.min_block_size == 0).all(axis=1)
+        & (rects[:, 0] + rects[:, 2] <= settings.grid_width)
+        & (rects[:, 1] + rects[:, 3] <= settings.grid_height)
+    )
 
-def calculate_price(db: Session, x_start: int, y_start: int, width: int, height: int) -> float:
-    """Calculate price based on region pricing"""
-    regions = db.query(GridRegion).all()
 
-    # Find matching region (simplified - takes first match)
-    price_per_pixel = settings.default_price_per_pixel
+async def calculate_price(db: AsyncSession, x_start: int, y_start: int, width: int, height: int) -> float:
+    """Calculate price based on region pricing (pro rata across every region covered)"""
+    raster = await pricing_service.get(db)
+    return raster.quote(x_start, y_start, width, height)
 
-    for region in regions:
-        if (x_start >= region.x_start and
-            y_start >= region.y_start and
-            x_start + width <= region.x_start + region.width and
-            y_start + height <= region.y_start + region.height):
-            price_per_pixel = float(region.price_per_pixel)
-            break
 
-    return (width * height) * price_per_pixel
+async def is_area_locked(db: AsyncSession, x_start: int, y_start: int, width: int, height: int) -> bool:
+    """Check if any part of the area lies in a locked region"""
+    raster = await pricing_service.get(db)
+    return raster.is_locked(x_start, y_start, width, height)
 
 
 @router.post("/check-availability", response_model=GridAvailabilityResponse)
 async def check_availability(
     data: GridAvailabilityCheck,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Check if grid area is available and get pricing"""
-    available, conflicting = check_grid_availability(
-        db, data.x_start, data.y_start, data.width, data.height
+    available, conflicting_ids = check_grid_availability(
+        data.x_start, data.y_start, data.width, data.height
     )
 
-    total_price = calculate_price(db, data.x_start, data.y_start, data.width, data.height)
+    # Only load full rows when there is something to report
+    conflicting = None
+    if not available:
+        conflicting = (await db.execute(select(Block).where(Block.id.in_(conflicting_ids)))).scalars().all()
+
+    on_grid = bool(fits_grid(np.array([[data.x_start, data.y_start, data.width, data.height]]))[0])
+    locked = await is_area_locked(db, data.x_start, data.y_start, data.width, data.height)
+    total_price = await calculate_price(db, data.x_start, data.y_start, data.width, data.height)
     price_per_pixel = total_price / (data.width * data.height)
 
     return {
-        "available": available,
-        "conflicting_blocks": conflicting if not available else None,
+        "available": available and on_grid and not locked,
+        "locked": locked,
+        "conflicting_blocks": conflicting,
+        "conflicting_block_ids": conflicting_ids if not available else None,
         "price_per_pixel": price_per_pixel,
         "total_price": total_price
     }
 
 
+@router.post("/check-availability/batch", response_model=GridAvailabilityBatchResponse)
+async def check_availability_batch(
+    data: GridAvailabilityBatchCheck,
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Check availability and pricing of many rectangles in one round trip
+    All rectangles are evaluated together against the occupancy and price rasters
+    """
+    rects = np.array([[r.x_start, r.y_start, r.width, r.height] for r in data.rectangles], dtype=np.int64)
+
+    raster = await pricing_service.get(db)
+    # Off-grid or unaligned rectangles can never be reserved
+    taken = (occupancy_index.occupied_cells(rects) > 0) | ~fits_grid(rects)
+    locked = raster.locked_many(rects)
+    totals = raster.quote_many(rects)
+    areas = np.maximum(rects[:, 2] * rects[:, 3], 1)
+
+    return {
+        "results": [
+            {
+                "x_start": r.x_start,
+                "y_start": r.y_start,
+                "width": r.width,
+                "height": r.height,
+                "available": not (is_taken or is_locked),
+                "locked": is_locked,
+                "price_per_pixel": total / area,
+                "total_price": total,
+            }
+            for r, is_taken, is_locked, total, area in zip(
+                data.rectangles, taken.tolist(), locked.tolist(), totals.tolist(), areas.tolist()
+            )
+        ]
+    }
+
+
+@router.get("/free-space", response_model=FreeSpaceResponse)
+async def find_free_space(
+    width: int = Query(..., ge=10, multiple_of=10),
+    height: int = Query(..., ge=10, multiple_of=10),
+    near_x: int | None = None,
+    near_y: int | None = None,
+    limit: int = Query(5, ge=1, le=50),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Find places a width x height block fits
+    Returns first-fit and cheapest candidates, plus the closest ones when near_x/near_y are given
+    """
+    raster = await pricing_service.get(db)
+    blocked = occupancy_index.occupied_mask() | raster.locked
+    near = (near_x, near_y) if near_x is not None and near_y is not None else None
+
+    found = find_positions(blocked, raster.prices, settings.min_block_size, width, height, limit, near)
+
+    return {"width": width, "height": height, **found}
+
+
+@router.get("/free-space/largest", response_model=LargestFreeRectangleResponse)
+async def find_largest_free_space(db: AsyncSession = Depends(get_db)):
+    """Get the largest empty rectangle on the grid"""
+    raster = await pricing_service.get(db)
+    blocked = occupancy_index.occupied_mask() | raster.locked
+
+    largest = largest_empty_rectangle(blocked)
+    if largest is None:
+        return {"found": False}
+
+    row, col, rows, cols = largest
+    cell = settings.min_block_size
+    x_start, y_start, width, height = col * cell, row * cell, cols * cell, rows * cell
+
+    return {
+        "found": True,
+        "x_start": x_start,
+        "y_start": y_start,
+        "width": width,
+        "height": height,
+        "total_price": raster.quote(x_start, y_start, width, height),
+    }
+
+
 @router.post("/reserve", response_model=BlockResponse)
 async def reserve_block(
     data: BlockCreate,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Reserve a block (step 1: before payment)
-    Creates block in 'draft' status with edit token
+    Creates block in 'draft' status with edit token; the area is held for
+    reservation_hold_minutes, after which an unpaid draft expires
     """
     # Validate grid boundaries
     if (data.x_start + data.width > settings.grid_width or
@@ -93,15 +189,24 @@ async def reserve_block(
         raise HTTPException(status_code=400, detail="Block exceeds grid boundaries")
 
     # Check availability
-    available, conflicting = check_grid_availability(
-        db, data.x_start, data.y_start, data.width, data.height
+    available, _ = check_grid_availability(
+        data.x_start, data.y_start, data.width, data.height
     )
 
     if not available:
         raise HTTPException(status_code=400, detail="Grid area is not available")
 
+    if await is_area_locked(db, data.x_start, data.y_start, data.width, data.height):
+        raise HTTPException(status_code=400, detail="Grid area is locked")
+
     # Calculate price
-    price = calculate_price(db, data.x_start, data.y_start, data.width, data.height)
+    price = await calculate_price(db, data.x_start, data.y_start, data.width, data.height)
+
+    # Serialize against overlapping reservations (on any worker), then re-check the DB;
+    # the locks are held until the draft is committed
+    await lock_area(db, data.x_start, data.y_start, data.width, data.height)
+    if await find_overlapping(db, data.x_start, data.y_start, data.width, data.height):
+        raise HTTPException(status_code=400, detail="Grid area is not available")
 
     # Create block
     edit_token = secrets.token_urlsafe(32)
@@ -119,128 +224,181 @@ async def reserve_block(
     )
 
     db.add(block)
-    db.commit()
-    db.refresh(block)
+    await db.commit()
+    await db.refresh(block)
+    block_reserved(block)
+    reservation_holds.add(block)
 
     return block
 
 
-@router.post("/{block_id}/upload", response_model=BlockImageResponse)
+@router.post("/{block_id}/upload", response_model=ModerationJobResponse, status_code=202)
 async def upload_block_image(
     block_id: UUID,
+    response: Response,
     edit_token: str = Form(...),
     link_url: str = Form(...),
     hover_title: str | None = Form(None),
     hover_description: str | None = Form(None),
     hover_cta: str | None = Form(None),
     image: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """
     Upload image for a block (step 2: after payment, before moderation)
-    Requires edit_token for security
+    Requires edit_token for security. Moderation runs in the background;
+    poll GET /blocks/{block_id}/moderation/{job_id} for the outcome.
     """
     # Verify block and edit token
-    block = db.query(Block).filter(Block.id == block_id).first()
+    block = await db.get(Block, block_id)
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
 
     if block.edit_token != edit_token:
         raise HTTPException(status_code=403, detail="Invalid edit token")
 
-    # Read image
-    image_bytes = await image.read()
-
-    # Validate file size
-    if len(image_bytes) > settings.max_image_size_mb * 1024 * 1024:
-        raise HTTPException(status_code=400, detail=f"Image too large (max {settings.max_image_size_mb}MB)")
-
-    # Process and upload image
-    storage = StorageService()
+    # The body is already spooled to a temporary file, capped by UploadSizeLimitMiddleware
+    pipeline = UploadPipeline(db)
     try:
-        processed_image = storage.validate_and_process_image(
-            image_bytes, block.width, block.height
+        job = await pipeline.run(
+            block, image.file, image.size, link_url, hover_title, hover_description, hover_cta
+        )
+    except UploadRejected as e:
+        raise HTTPException(
+            status_code=e.status_code, detail=e.detail, headers={'Server-Timing': pipeline.server_timing()}
         )
-        s3_key, image_url = storage.upload_image(processed_image, str(block_id))
-    except ValueError as e:
-        raise HTTPException(status_code=400, detail=str(e))
-
-    # Create block image record
-    moderation = ModerationService(db)
-    image_hash = moderation.calculate_image_hash(processed_image)
-
-    # Check if image hash is banned
-    if moderation.check_banned_hash(image_hash):
-        storage.delete_image(s3_key)
-        raise HTTPException(status_code=400, detail="This image has been banned")
-
-    # Check if URL domain is banned
-    if moderation.check_banned_domain(link_url):
-        storage.delete_image(s3_key)
-        raise HTTPException(status_code=400, detail="This domain has been banned")
-
-    block_image = BlockImage(
-        block_id=block_id,
-        image_url=image_url,
-        image_hash=image_hash,
-        link_url=link_url,
-        hover_title=hover_title,
-        hover_description=hover_description,
-        hover_cta=hover_cta
-    )
 
-    db.add(block_image)
-    db.commit()
-    db.refresh(block_image)
+    response.headers['Server-Timing'] = pipeline.server_timing()
 
-    # Run moderation in background (async in production)
-    moderation_result = await moderation.run_full_moderation(
-        processed_image, s3_key, link_url, str(block_image.id)
-    )
+    return job.to_dict()
 
-    # Update block status based on moderation
-    if moderation_result['auto_approve']:
-        block.status = 'approved'
-        block.approved_at = db.query(Block).filter(Block.id == block_id).first().approved_at
-    else:
-        block.status = 'pending_review'
 
-    db.commit()
+@router.get("/{block_id}/moderation/{job_id}", response_model=ModerationJobResponse)
+async def get_moderation_job(block_id: UUID, job_id: UUID, wait: float = 0, db: AsyncSession = Depends(get_db)):
+    """
+    Get the status of a moderation job
+    Pass wait=<seconds> (max 30) to long-poll until the job finishes
+    """
+    job = moderation_pool.get(job_id)
+    if job is not None and job.block_id == block_id:
+        if wait > 0 and not job.done.is_set():
+            try:
+                await asyncio.wait_for(job.done.wait(), timeout=min(wait, 30))
+            except asyncio.TimeoutError:
+                pass
+        return job.to_dict()
+
+    # Not tracked by this worker (finished long ago, restarted, or another process)
+    result = await db.execute(select(Block.status).join(
+        BlockImage, BlockImage.block_id == Block.id
+    ).where(
+        BlockImage.id == job_id,
+        BlockImage.block_id == block_id
+    ))
+    block_status = result.scalar()
+    if block_status is None:
+        raise HTTPException(status_code=404, detail="Moderation job not found")
+
+    checks = (await db.execute(
+        select(ModerationCheck.flagged).where(ModerationCheck.block_image_id == job_id)
+    )).all()
 
-    return block_image
+    return {
+        'job_id': job_id,
+        'block_id': block_id,
+        'block_image_id': job_id,
+        'status': 'completed' if checks else 'unknown',
+        'block_status': block_status,
+        'flagged': any(flagged for flagged, in checks) if checks else None,
+        'error': None,
+    }
 
 
 @router.get("/grid", response_model=list[GridBlockResponse])
-async def get_grid_state(db: Session = Depends(get_db)):
-    """Get all approved blocks for grid rendering"""
-    blocks = db.query(Block).filter(Block.status == 'approved').all()
-
-    # Transform blocks with their images
-    grid_blocks = []
-    for block in blocks:
-        # Get the associated image if it exists
-        image = db.query(BlockImage).filter(BlockImage.block_id == block.id).first()
-
-        grid_blocks.append({
-            'id': block.id,
-            'x_start': block.x_start,
-            'y_start': block.y_start,
-            'width': block.width,
-            'height': block.height,
-            'image_url': image.image_url if image else None,
-            'link_url': block.link_url,
-            'hover_title': image.hover_title if image else None,
-            'hover_description': image.hover_description if image else None,
-            'hover_cta': image.hover_cta if image else None,
-        })
-
-    return grid_blocks
+async def get_grid_state(request: Request, db: AsyncSession = Depends(get_db)):
+    """Get all approved blocks for grid rendering (served from the grid snapshot)"""
+    snapshot = await grid_snapshot_cache.get(db)
+    headers = {
+        'ETag': snapshot.etag,
+        'X-Grid-Version': str(snapshot.version),
+        'X-Grid-Epoch': grid_change_log.epoch,
+        'Cache-Control': 'no-cache',
+        'Vary': 'Accept-Encoding',
+    }
+
+    if request.headers.get('if-none-match') == snapshot.etag:
+        return Response(status_code=304, headers=headers)
+
+    encoding = negotiate_encoding(request.headers.get('accept-encoding', ''))
+    if encoding is not None:
+        headers['Content-Encoding'] = encoding
+        return Response(content=snapshot.encoded_bodies[encoding], media_type='application/json', headers=headers)
+
+    return Response(content=snapshot.body, media_type='application/json', headers=headers)
+
+
+@router.get("/grid/changes", response_model=GridChangesResponse)
+async def get_grid_changes(since: int, epoch: str | None = None):
+    """
+    Get grid changes after a sequence number
+    Start from X-Grid-Version of GET /blocks/grid; refetch the grid when resync_required is set
+    """
+    resync_required, changes = grid_change_log.since(since, epoch)
+
+    return {
+        "epoch": grid_change_log.epoch,
+        "latest_seq": grid_change_log.latest_seq,
+        "resync_required": resync_required,
+        "changes": changes
+    }
+
+
+@router.get("/grid/events")
+async def stream_grid_events(request: Request):
+    """
+    Live grid updates as server-sent events (added, updated, removed, reserved, released)
+    Reconnects with Last-Event-ID replay missed changes; a 'resync' event means refetch /blocks/grid
+    """
+    return StreamingResponse(
+        grid_hub.stream(request.headers.get('last-event-id')),
+        media_type='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@router.get("/grid/tiles")
+async def get_tile_manifest():
+    """Get the tile pyramid layout and the current version of every tile"""
+    return tile_service.manifest()
+
+
+@router.get("/grid/tiles/{z}/{x}/{y}")
+async def get_grid_tile(z: int, x: int, y: int, request: Request, v: str | None = None):
+    """
+    Get a rendered PNG tile of the grid mosaic
+    Requests pinned to the current version (?v=) are cacheable forever
+    """
+    # A cache miss downloads the tile from S3 (blocking boto3), so keep it off the event loop
+    tile = await asyncio.to_thread(tile_service.get_tile, z, x, y)
+    if tile is None:
+        raise HTTPException(status_code=404, detail="Tile not found")
+
+    content, version = tile
+    headers = {
+        'ETag': f'"{version}"',
+        'Cache-Control': 'public, max-age=31536000, immutable' if v == version else 'public, max-age=60',
+    }
+
+    if request.headers.get('if-none-match') == headers['ETag']:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=content, media_type='image/png', headers=headers)
 
 
 @router.get("/{block_id}", response_model=BlockResponse)
-async def get_block(block_id: UUID, db: Session = Depends(get_db)):
+async def get_block(block_id: UUID, db: AsyncSession = Depends(get_db)):
     """Get block details"""
-    block = db.query(Block).filter(Block.id == block_id).first()
+    block = await db.get(Block, block_id)
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
     return block
@@ -1,47 +1,86 @@
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import select, exists, true, tuple_
+from sqlalchemy.orm import aliased, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from uuid import UUID
 from ..database import get_db
 from ..models import Block, BlockImage, ModerationCheck, AdminAction, BannedContent
 from ..auth import get_current_admin
-from ..schemas import ModerationDecision
+from ..schemas import ModerationDecision, ModerationQueueResponse
+from ..services.grid_events import block_status_changed
+from ..services.banned_matcher import banned_matcher
+from ..services.pagination import encode_cursor, decode_cursor
+from ..services.block_images import latest_image_first
 
 router = APIRouter(prefix="/moderation", tags=["moderation"])
 
 
-@router.get("/pending")
+@router.get("/pending", response_model=ModerationQueueResponse)
 async def get_pending_blocks(
-    skip: int = 0,
-    limit: int = 20,
+    cursor: str | None = None,
+    limit: int = Query(20, ge=1, le=100),
+    category: str | None = None,
+    provider: str | None = None,
+    min_confidence: float | None = Query(None, ge=0, le=1),
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
-    """Get blocks pending moderation review"""
-    blocks = db.query(Block).filter(
+    """
+    Get blocks pending moderation review, newest purchase first
+    category/provider/min_confidence keep blocks whose latest image has a flagged check matching all of them
+    """
+    # Latest image of each block on the page: a top-1 lateral lookup on (block_id, moderation_version)
+    latest = select(BlockImage).where(
+        BlockImage.block_id == Block.id
+    ).order_by(*latest_image_first()).limit(1).lateral()
+    image = aliased(BlockImage, latest)
+
+    query = select(Block, image).outerjoin(latest, true()).where(
         Block.status == 'pending_review'
-    ).order_by(Block.purchased_at.desc()).offset(skip).limit(limit).all()
-
-    result = []
-    for block in blocks:
-        # Get latest image
-        image = db.query(BlockImage).filter(
-            BlockImage.block_id == block.id
-        ).order_by(BlockImage.moderation_version.desc()).first()
-
-        # Get moderation checks
-        checks = []
-        if image:
-            checks = db.query(ModerationCheck).filter(
-                ModerationCheck.block_image_id == image.id
-            ).all()
-
-        result.append({
-            'block': block,
-            'image': image,
-            'moderation_checks': checks
-        })
-
-    return result
+    ).options(selectinload(image.moderation_checks))
+
+    if cursor:
+        try:
+            purchased_at, block_id = decode_cursor(cursor)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Block.purchased_at, Block.id) < tuple_(purchased_at, block_id))
+
+    if category is not None or provider is not None or min_confidence is not None:
+        check = select(ModerationCheck.id).where(
+            ModerationCheck.block_image_id == image.id,
+            ModerationCheck.flagged.is_(True)
+        )
+        if category is not None:
+            check = check.where(ModerationCheck.flagged_categories.any(category))
+        if provider is not None:
+            check = check.where(ModerationCheck.check_type == provider)
+        if min_confidence is not None:
+            check = check.where(ModerationCheck.confidence >= min_confidence)
+        query = query.where(exists(check))
+
+    rows = (await db.execute(
+        query.order_by(Block.purchased_at.desc(), Block.id.desc()).limit(limit + 1)
+    )).all()
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1][0]
+        next_cursor = encode_cursor(last.purchased_at, last.id)
+
+    return {
+        'items': [
+            {
+                'block': block,
+                'image': block_image,
+                'moderation_checks': block_image.moderation_checks if block_image else []
+            }
+            for block, block_image in rows
+        ],
+        'next_cursor': next_cursor
+    }
 
 
 @router.post("/{block_id}/decide")
@@ -49,19 +88,20 @@ async def moderate_block(
     block_id: UUID,
     decision: ModerationDecision,
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Approve or reject a block"""
-    block = db.query(Block).filter(Block.id == block_id).first()
+    block = await db.get(Block, block_id)
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
 
     if block.status != 'pending_review':
         raise HTTPException(status_code=400, detail="Block is not pending review")
 
+    previous_status = block.status
     if decision.decision == 'approve':
         block.status = 'approved'
-        block.approved_at = db.query(Block).filter(Block.id == block_id).first().approved_at
+        block.approved_at = datetime.utcnow()
 
         # Log action
         action = AdminAction(
@@ -87,7 +127,8 @@ async def moderate_block(
         )
         db.add(action)
 
-    db.commit()
+    await db.commit()
+    await block_status_changed(db, block, previous_status)
 
     return {"status": "success", "new_status": block.status}
 
@@ -97,16 +138,17 @@ async def remove_published_block(
     block_id: UUID,
     reason: str,
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Remove a block that was previously approved"""
-    block = db.query(Block).filter(Block.id == block_id).first()
+    block = await db.get(Block, block_id)
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
 
     if block.status != 'approved':
         raise HTTPException(status_code=400, detail="Block is not approved")
 
+    previous_status = block.status
     block.status = 'removed_after_publish'
     block.rejection_reason = reason
 
@@ -119,7 +161,8 @@ async def remove_published_block(
         reason=reason
     )
     db.add(action)
-    db.commit()
+    await db.commit()
+    await block_status_changed(db, block, previous_status)
 
     return {"status": "success", "message": "Block removed"}
 
@@ -129,13 +172,14 @@ async def ban_domain(
     domain: str,
     reason: str,
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Ban a domain"""
-    existing = db.query(BannedContent).filter(
+    result = await db.execute(select(BannedContent).where(
         BannedContent.ban_type == 'domain',
         BannedContent.value == domain
-    ).first()
+    ))
+    existing = result.scalars().first()
 
     if existing:
         raise HTTPException(status_code=400, detail="Domain already banned")
@@ -154,11 +198,12 @@ async def ban_domain(
         action_type='ban_domain',
         target_type='domain',
         reason=reason,
-        metadata={'domain': domain}
+        meta_data={'domain': domain}
     )
     db.add(action)
 
-    db.commit()
+    await db.commit()
+    await banned_matcher.rebuild(db)
 
     return {"status": "success", "message": f"Domain {domain} banned"}
 
@@ -168,13 +213,14 @@ async def ban_image_hash(
     image_hash: str,
     reason: str,
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Ban an image hash"""
-    existing = db.query(BannedContent).filter(
+    result = await db.execute(select(BannedContent).where(
         BannedContent.ban_type == 'image_hash',
         BannedContent.value == image_hash
-    ).first()
+    ))
+    existing = result.scalars().first()
 
     if existing:
         raise HTTPException(status_code=400, detail="Image hash already banned")
@@ -193,11 +239,12 @@ async def ban_image_hash(
         action_type='ban_image_hash',
         target_type='image_hash',
         reason=reason,
-        metadata={'image_hash': image_hash}
+        meta_data={'image_hash': image_hash}
     )
     db.add(action)
 
-    db.commit()
+    await db.commit()
+    await banned_matcher.rebuild(db)
 
     return {"status": "success", "message": "Image hash banned"}
 
@@ -205,8 +252,8 @@ async def ban_image_hash(
 @router.get("/banned")
 async def get_banned_content(
     admin = Depends(get_current_admin),
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Get all banned content"""
-    banned = db.query(BannedContent).order_by(BannedContent.banned_at.desc()).all()
-    return banned
+    result = await db.execute(select(BannedContent).order_by(BannedContent.banned_at.desc()))
+    return result.scalars().all()
@@ -1,11 +1,18 @@
+import asyncio
+import time
 from fastapi import APIRouter, Depends, HTTPException, Request
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from datetime import datetime
 from uuid import UUID
 import stripe
-from ..database import get_db
+from ..database import get_db, is_exclusion_violation
 from ..models import Block, Payment
 from ..schemas import CheckoutSession
 from ..config import get_settings
+from ..services.grid_events import block_status_changed
+from ..services.occupancy import holds_area
 
 router = APIRouter(prefix="/payments", tags=["payments"])
 settings = get_settings()
@@ -17,16 +24,25 @@ stripe.api_key = settings.stripe_secret_key
 async def create_checkout_session(
     block_id: UUID,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Create Stripe checkout session for block payment"""
-    block = db.query(Block).filter(Block.id == block_id).first()
+    # Row lock: the expiry sweep can't archive the draft while its checkout starts
+    result = await db.execute(select(Block).where(Block.id == block_id).with_for_update())
+    block = result.scalars().first()
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
 
+    if block.status == 'expired':
+        raise HTTPException(status_code=410, detail="Reservation expired, reserve the area again")
+
     if block.status != 'draft':
         raise HTTPException(status_code=400, detail="Block already paid")
 
+    # Lapsed but not yet swept: the area may already be reserved by someone else
+    if await db.scalar(select(Block.id).where(Block.id == block_id, holds_area())) is None:
+        raise HTTPException(status_code=410, detail="Reservation expired, reserve the area again")
+
     # Check if request is from test mode IP
     client_ip = request.client.host
     if settings.test_mode_enabled and client_ip in settings.test_mode_ips:
@@ -53,6 +69,8 @@ async def create_checkout_session(
                 'quantity': 1,
             }],
             mode='payment',
+            # The pending payment extends the hold only this long (see holds_area)
+            expires_at=int(time.time()) + settings.checkout_session_minutes * 60,
             success_url=f"{settings.frontend_url}/checkout/success?block_id={block_id}&session_id={{CHECKOUT_SESSION_ID}}",
             cancel_url=f"{settings.frontend_url}/checkout/cancel?block_id={block_id}",
             customer_email=block.buyer_email,
@@ -69,7 +87,7 @@ async def create_checkout_session(
             status='pending'
         )
         db.add(payment)
-        db.commit()
+        await db.commit()
 
         return {
             "session_id": session.id,
@@ -84,7 +102,7 @@ async def create_checkout_session(
 async def complete_test_payment(
     block_id: UUID,
     request: Request,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Complete test payment (bypass Stripe for testing)"""
     # Check if request is from test mode IP
@@ -92,13 +110,22 @@ async def complete_test_payment(
     if not settings.test_mode_enabled or client_ip not in settings.test_mode_ips:
         raise HTTPException(status_code=403, detail="Test mode not available")
 
-    block = db.query(Block).filter(Block.id == block_id).first()
+    # Row lock: the expiry sweep can't archive the draft while it is being paid
+    result = await db.execute(select(Block).where(Block.id == block_id).with_for_update())
+    block = result.scalars().first()
     if not block:
         raise HTTPException(status_code=404, detail="Block not found")
 
+    if block.status == 'expired':
+        raise HTTPException(status_code=410, detail="Reservation expired, reserve the area again")
+
     if block.status != 'draft':
         raise HTTPException(status_code=400, detail="Block already paid")
 
+    # Lapsed but not yet swept: the area may already be reserved by someone else
+    if await db.scalar(select(Block.id).where(Block.id == block_id, holds_area())) is None:
+        raise HTTPException(status_code=410, detail="Reservation expired, reserve the area again")
+
     # Create test payment record
     payment = Payment(
         block_id=block_id,
@@ -109,10 +136,18 @@ async def complete_test_payment(
     db.add(payment)
 
     # Update block status to pending review (ready for image upload)
+    previous_status = block.status
     block.status = 'pending_review'
 
-    db.commit()
-    db.refresh(block)
+    try:
+        await db.commit()
+    except IntegrityError as e:
+        await db.rollback()
+        # Another purchase of an overlapping area committed first
+        if is_exclusion_violation(e):
+            raise HTTPException(status_code=409, detail="Grid area is no longer available")
+        raise
+    await block_status_changed(db, block, previous_status)
 
     return {
         "status": "success",
@@ -122,7 +157,7 @@ async def complete_test_payment(
 
 
 @router.post("/webhook")
-async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
+async def stripe_webhook(request: Request, db: AsyncSession = Depends(get_db)):
     """Handle Stripe webhook events"""
     payload = await request.body()
     sig_header = request.headers.get('stripe-signature')
@@ -139,52 +174,108 @@ async def stripe_webhook(request: Request, db: Session = Depends(get_db)):
     # Handle the event
     if event['type'] == 'checkout.session.completed':
         session = event['data']['object']
-        block_id = session['metadata']['block_id']
-
-        # Update payment status
-        payment = db.query(Payment).filter(
-            Payment.stripe_payment_id == session['id']
-        ).first()
-
-        if payment:
-            payment.status = 'succeeded'
-            payment.stripe_customer_id = session.get('customer')
-            payment.paid_at = db.query(Payment).filter(Payment.id == payment.id).first().paid_at
-            db.commit()
+        await _complete_checkout(db, session)
 
     elif event['type'] == 'charge.refunded':
         charge = event['data']['object']
         payment_intent_id = charge.get('payment_intent')
 
         # Find payment by payment intent
-        payment = db.query(Payment).filter(
+        result = await db.execute(select(Payment).where(
             Payment.stripe_payment_id.contains(payment_intent_id)
-        ).first()
+        ))
+        payment = result.scalars().first()
 
         if payment:
             payment.status = 'refunded'
-            payment.refunded_at = db.query(Payment).filter(Payment.id == payment.id).first().refunded_at
+            payment.refunded_at = datetime.utcnow()
 
             # Update block status
-            block = db.query(Block).filter(Block.id == payment.block_id).first()
+            block = await db.get(Block, payment.block_id)
             if block:
+                previous_status = block.status
                 block.status = 'rejected'
                 block.rejection_reason = 'Payment refunded'
 
-            db.commit()
+            await db.commit()
+
+            if block:
+                await block_status_changed(db, block, previous_status)
 
     return {"status": "success"}
 
 
+async def _complete_checkout(db: AsyncSession, session):
+    """Record a completed checkout and move the paid draft into review, refunding if its area is gone"""
+    block_id = UUID(session['metadata']['block_id'])
+    result = await db.execute(select(Block).where(Block.id == block_id).with_for_update())
+    block = result.scalars().first()
+
+    result = await db.execute(select(Payment).where(
+        Payment.stripe_payment_id == session['id']
+    ))
+    payment = result.scalars().first()
+    if not payment or not block:
+        return
+
+    payment.status = 'succeeded'
+    payment.stripe_customer_id = session.get('customer')
+    payment.paid_at = datetime.utcnow()
+
+    previous_status = block.status
+    if block.status == 'draft':
+        block.status = 'pending_review'
+        try:
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            if not is_exclusion_violation(e):
+                raise
+            # Another purchase of an overlapping area committed first
+            await _refund_unavailable(db, block_id, session)
+            return
+        await block_status_changed(db, block, previous_status)
+    elif block.status == 'expired':
+        await _refund_unavailable(db, block_id, session)
+    else:
+        # Already moved on by moderation of an uploaded image
+        await db.commit()
+
+
+async def _refund_unavailable(db: AsyncSession, block_id: UUID, session):
+    """Refund a checkout whose block lost (or never kept) its grid area"""
+    reason = "Grid area no longer available"
+    await asyncio.to_thread(
+        stripe.Refund.create, payment_intent=session['payment_intent'], reason='requested_by_customer',
+        idempotency_key=f"refund-{session['id']}"
+    )
+
+    result = await db.execute(select(Block).where(Block.id == block_id).with_for_update())
+    block = result.scalars().first()
+    result = await db.execute(select(Payment).where(Payment.stripe_payment_id == session['id']))
+    payment = result.scalars().first()
+
+    payment.status = 'refunded'
+    payment.refund_reason = reason
+    payment.refunded_at = datetime.utcnow()
+
+    previous_status = block.status
+    block.status = 'rejected'
+    block.rejection_reason = reason
+    await db.commit()
+    await block_status_changed(db, block, previous_status)
+
+
 @router.get("/{block_id}/status")
 async def get_payment_status(
     block_id: UUID,
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db)
 ):
     """Check payment status for a block"""
-    payment = db.query(Payment).filter(
+    result = await db.execute(select(Payment).where(
         Payment.block_id == block_id
-    ).order_by(Payment.created_at.desc()).first()
+    ).order_by(Payment.created_at.desc()).limit(1))
+    payment = result.scalars().first()
 
     if not payment:
         return {"status": "no_payment"}
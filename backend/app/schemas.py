@@ -27,8 +27,8 @@ class AdminResponse(BaseModel):
 
 # Block schemas
 class BlockCreate(BaseModel):
-    x_start: int = Field(..., ge=0, lt=1000)
-    y_start: int = Field(..., ge=0, lt=1000)
+    x_start: int = Field(..., ge=0, lt=1000, multiple_of=10)
+    y_start: int = Field(..., ge=0, lt=1000, multiple_of=10)
     width: int = Field(..., ge=10, multiple_of=10)
     height: int = Field(..., ge=10, multiple_of=10)
     buyer_email: EmailStr | None = None
@@ -68,6 +68,7 @@ class GridBlockResponse(BaseModel):
     width: int
     height: int
     image_url: str | None
+    image_variants: dict[str, str] | None = None
     link_url: str | None
     hover_title: str | None
     hover_description: str | None
@@ -77,10 +78,25 @@ class GridBlockResponse(BaseModel):
         from_attributes = True
 
 
+class GridChange(BaseModel):
+    seq: int
+    op: str  # added, updated or removed
+    block_id: UUID
+    block: GridBlockResponse | None = None
+
+
+class GridChangesResponse(BaseModel):
+    epoch: str
+    latest_seq: int
+    resync_required: bool
+    changes: list[GridChange]
+
+
 class BlockImageResponse(BaseModel):
     id: UUID
     block_id: UUID
     image_url: str
+    image_variants: dict[str, str] | None = None
     link_url: str
     hover_title: str | None
     hover_description: str | None
@@ -107,6 +123,33 @@ class ModerationCheckResponse(BaseModel):
         from_attributes = True
 
 
+class ModerationImageResponse(BlockImageResponse):
+    image_hash: str
+    perceptual_hash: str | None
+    moderation_version: int | None
+
+
+class ModerationQueueItem(BaseModel):
+    block: BlockResponse
+    image: ModerationImageResponse | None
+    moderation_checks: list[ModerationCheckResponse]
+
+
+class ModerationQueueResponse(BaseModel):
+    items: list[ModerationQueueItem]
+    next_cursor: str | None  # pass back as ?cursor= for the next page; None on the last page
+
+
+class ModerationJobResponse(BaseModel):
+    job_id: UUID
+    block_id: UUID
+    block_image_id: UUID
+    status: str  # queued, running, completed, failed (or unknown once no longer tracked)
+    block_status: str | None = None
+    flagged: bool | None = None
+    error: str | None = None
+
+
 class ModerationDecision(BaseModel):
     decision: str = Field(..., pattern="^(approve|reject)$")
     reason: str | None = None
@@ -146,22 +189,74 @@ class AdminActionResponse(BaseModel):
     target_type: str
     target_id: UUID | None
     reason: str | None
+    meta_data: dict | None = None
     created_at: datetime
 
     class Config:
         from_attributes = True
 
 
+class AdminActionPage(BaseModel):
+    items: list[AdminActionResponse]
+    next_cursor: str | None  # pass back as ?cursor= for the next page; None on the last page
+
+
 # Grid availability
 class GridAvailabilityCheck(BaseModel):
-    x_start: int
-    y_start: int
-    width: int
-    height: int
+    x_start: int = Field(..., ge=0)
+    y_start: int = Field(..., ge=0)
+    width: int = Field(..., gt=0)
+    height: int = Field(..., gt=0)
 
 
 class GridAvailabilityResponse(BaseModel):
     available: bool
     conflicting_blocks: list[BlockResponse] | None = None
+    conflicting_block_ids: list[UUID] | None = None
+    locked: bool = False
+    price_per_pixel: Decimal
+    total_price: Decimal
+
+
+class GridAvailabilityBatchCheck(BaseModel):
+    rectangles: list[GridAvailabilityCheck] = Field(..., min_length=1, max_length=1000)
+
+
+class GridAvailabilityBatchResult(BaseModel):
+    x_start: int
+    y_start: int
+    width: int
+    height: int
+    available: bool
+    locked: bool
     price_per_pixel: Decimal
     total_price: Decimal
+
+
+class GridAvailabilityBatchResponse(BaseModel):
+    results: list[GridAvailabilityBatchResult]
+
+
+class FreeSpaceCandidate(BaseModel):
+    strategy: str  # first_fit, cheapest or closest
+    x_start: int
+    y_start: int
+    width: int
+    height: int
+    total_price: Decimal
+
+
+class FreeSpaceResponse(BaseModel):
+    width: int
+    height: int
+    available_positions: int
+    candidates: list[FreeSpaceCandidate]
+
+
+class LargestFreeRectangleResponse(BaseModel):
+    found: bool
+    x_start: int | None = None
+    y_start: int | None = None
+    width: int | None = None
+    height: int | None = None
+    total_price: Decimal | None = None
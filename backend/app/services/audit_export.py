@@ -0,0 +1,74 @@
+import csv
+import io
+import json
+from typing import AsyncIterator
+from sqlalchemy import select
+from ..database import SessionLocal
+from ..models import Admin, AdminAction
+from ..config import get_settings
+
+settings = get_settings()
+
+EXPORT_COLUMNS = (
+    'id', 'created_at', 'admin_id', 'admin_email', 'action_type',
+    'target_type', 'target_id', 'reason', 'meta_data'
+)
+
+EXPORT_FORMATS = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv',
+}
+
+
+def _json_value(value):
+    return value.isoformat() if hasattr(value, 'isoformat') else str(value)
+
+
+def _ndjson_chunk(rows) -> str:
+    return ''.join(json.dumps(dict(zip(EXPORT_COLUMNS, row)), default=_json_value) + '\n' for row in rows)
+
+
+def _csv_value(value) -> str:
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value
+    if isinstance(value, dict):
+        return json.dumps(value)
+    return _json_value(value)
+
+
+def _csv_chunk(rows, header: bool = False) -> str:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if header:
+        writer.writerow(EXPORT_COLUMNS)
+    writer.writerows([_csv_value(value) for value in row] for row in rows)
+    return buffer.getvalue()
+
+
+async def stream_admin_actions(conditions: list, fmt: str) -> AsyncIterator[str]:
+    """
+    Export matching admin actions, oldest first, as NDJSON lines or CSV.
+
+    Opens its own session, since the request's session is closed before a
+    streaming body is sent, and reads through a server-side cursor one batch
+    at a time, so memory stays flat however many rows match.
+    """
+    query = select(
+        AdminAction.id, AdminAction.created_at, AdminAction.admin_id, Admin.email,
+        AdminAction.action_type, AdminAction.target_type, AdminAction.target_id,
+        AdminAction.reason, AdminAction.meta_data
+    ).join(Admin, Admin.id == AdminAction.admin_id).where(
+        *conditions
+    ).order_by(AdminAction.created_at, AdminAction.id).execution_options(
+        yield_per=settings.audit_export_batch_size
+    )
+
+    if fmt == 'csv':
+        yield _csv_chunk([], header=True)
+
+    async with SessionLocal() as db:
+        result = await db.stream(query)
+        async for rows in result.partitions():
+            yield _csv_chunk(rows) if fmt == 'csv' else _ndjson_chunk(rows)
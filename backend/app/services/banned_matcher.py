@@ -0,0 +1,233 @@
+import time
+import threading
+from collections import deque
+from urllib.parse import urlsplit
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import BannedContent, BlockImage
+from ..config import get_settings
+from .storage import is_distinctive_hash
+
+settings = get_settings()
+
+# Always-on keyword lists, scanned alongside the banned keywords
+EXPLICIT_TEXT_KEYWORDS = ['porn', 'xxx', 'sex', 'adult', 'casino', 'bitcoin', 'crypto']
+SUSPICIOUS_URL_KEYWORDS = ['casino', 'porn', 'xxx', 'adult', 'bitcoin', 'crypto', 'free-money']
+
+_END = object()
+
+
+def extract_host(url: str) -> str | None:
+    """Lowercased host of an http(s) URL, without port or trailing dot"""
+    try:
+        parts = urlsplit(url.strip())
+    except ValueError:
+        return None
+    if parts.scheme not in ('http', 'https') or not parts.hostname:
+        return None
+    return parts.hostname.rstrip('.')
+
+
+def normalize_domain(value: str) -> str:
+    """Turn a ban value ('Example.com', '*.example.com', 'https://example.com/x') into a bare domain"""
+    value = value.strip().lower()
+    if '://' in value:
+        value = extract_host(value) or ''
+    return value.lstrip('*').strip('.')
+
+
+class KeywordAutomaton:
+    """Aho-Corasick automaton: finds every keyword in one pass over the text"""
+
+    def __init__(self, keywords: list[str]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        self._out: list[list[str]] = [[]]
+
+        for keyword in keywords:
+            pattern = keyword.lower()
+            if not pattern:
+                continue
+            node = 0
+            for ch in pattern:
+                child = self._goto[node].get(ch)
+                if child is None:
+                    child = len(self._goto)
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                    self._goto[node][ch] = child
+                node = child
+            if keyword not in self._out[node]:
+                self._out[node].append(keyword)
+
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for ch, child in self._goto[node].items():
+                queue.append(child)
+                fail = self._fail[node]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[child] = self._goto[fail].get(ch, 0)
+                self._out[child] = self._out[child] + self._out[self._fail[child]]
+
+    def search(self, text: str) -> list[str]:
+        """Keywords occurring in text, in order of first occurrence"""
+        goto, fail, out = self._goto, self._fail, self._out
+        found = []
+        seen = set()
+        node = 0
+        for ch in text.lower():
+            while node and ch not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(ch, 0)
+            for keyword in out[node]:
+                if keyword not in seen:
+                    seen.add(keyword)
+                    found.append(keyword)
+        return found
+
+
+class BKTree:
+    """Burkhard-Keller tree over 64-bit hashes for hamming-distance queries"""
+
+    def __init__(self, hashes: list[int]):
+        self._root = None
+        self.size = 0
+        for value in hashes:
+            self.add(value)
+
+    def add(self, value: int):
+        if self._root is None:
+            self._root = (value, {})
+            self.size = 1
+            return
+
+        node = self._root
+        while True:
+            distance = (node[0] ^ value).bit_count()
+            if distance == 0:
+                return
+            child = node[1].get(distance)
+            if child is None:
+                node[1][distance] = (value, {})
+                self.size += 1
+                return
+            node = child
+
+    def within(self, value: int, max_distance: int) -> bool:
+        """True if any stored hash is within max_distance bits of value"""
+        if self._root is None:
+            return False
+
+        stack = [self._root]
+        while stack:
+            node_value, children = stack.pop()
+            distance = (node_value ^ value).bit_count()
+            if distance <= max_distance:
+                return True
+            for child_distance in range(distance - max_distance, distance + max_distance + 1):
+                child = children.get(child_distance)
+                if child is not None:
+                    stack.append(child)
+        return False
+
+
+class CompiledBans:
+    """Immutable snapshot of all bans, compiled for O(input length) lookups"""
+
+    def __init__(self, generation: int, image_hashes: list[str], domains: list[str], keywords: list[str],
+                 perceptual_hashes: list[str] = ()):
+        self.generation = generation
+        self.image_hashes = frozenset(h.lower() for h in image_hashes)
+        # Flat-image hashes (e.g. stored before they were filtered out) would match every plain image
+        self.perceptual_hashes = BKTree([int(h, 16) for h in perceptual_hashes if is_distinctive_hash(h)])
+
+        # Reversed-label trie: 'ads.example.com' is stored as com -> example -> ads
+        self.domain_trie: dict = {}
+        for domain in domains:
+            domain = normalize_domain(domain)
+            if not domain:
+                continue
+            node = self.domain_trie
+            for label in reversed(domain.split('.')):
+                node = node.setdefault(label, {})
+            node[_END] = True
+
+        self.text_keywords = KeywordAutomaton(keywords + EXPLICIT_TEXT_KEYWORDS)
+        self.url_keywords = KeywordAutomaton(keywords + SUSPICIOUS_URL_KEYWORDS)
+
+    def is_hash_banned(self, image_hash: str) -> bool:
+        return image_hash.lower() in self.image_hashes
+
+    def is_near_duplicate_banned(self, perceptual_hash: str | None, max_distance: int) -> bool:
+        """True if a banned image's perceptual hash is within max_distance bits"""
+        if not is_distinctive_hash(perceptual_hash):
+            return False
+        return self.perceptual_hashes.within(int(perceptual_hash, 16), max_distance)
+
+    def is_domain_banned(self, url: str) -> bool:
+        """True if the URL's host is a banned domain or a subdomain of one"""
+        host = extract_host(url)
+        if not host:
+            return False
+
+        node = self.domain_trie
+        for label in reversed(host.split('.')):
+            node = node.get(label)
+            if node is None:
+                return False
+            if _END in node:
+                return True
+        return False
+
+
+class BannedContentMatcher:
+    """
+    Process-wide holder of the compiled bans. Rebuilt from the DB at startup,
+    after each new ban, and lazily once it is older than the refresh interval
+    (which also picks up bans added by other workers or directly in the DB).
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._compiled: CompiledBans | None = None
+        self._built_at = 0.0
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    async def rebuild(self, db: AsyncSession) -> CompiledBans:
+        rows = (await db.execute(select(BannedContent.ban_type, BannedContent.value))).all()
+        # Fingerprints of every stored image whose exact hash is banned
+        perceptual_hashes = (await db.execute(select(BlockImage.perceptual_hash).join(
+            BannedContent, BannedContent.value == BlockImage.image_hash
+        ).where(
+            BannedContent.ban_type == 'image_hash',
+            BlockImage.perceptual_hash.isnot(None)
+        ).distinct())).all()
+        with self._lock:
+            self._generation += 1
+            generation = self._generation
+
+        compiled = CompiledBans(
+            generation=generation,
+            image_hashes=[value for ban_type, value in rows if ban_type == 'image_hash'],
+            domains=[value for ban_type, value in rows if ban_type == 'domain'],
+            keywords=[value for ban_type, value in rows if ban_type == 'keyword'],
+            perceptual_hashes=[value for value, in perceptual_hashes],
+        )
+        with self._lock:
+            if self._compiled is None or self._compiled.generation < generation:
+                self._compiled = compiled
+                self._built_at = time.monotonic()
+        return compiled
+
+    async def get(self, db: AsyncSession) -> CompiledBans:
+        compiled = self._compiled
+        if compiled is None or time.monotonic() - self._built_at > self.refresh_seconds:
+            compiled = await self.rebuild(db)
+        return compiled
+
+
+banned_matcher = BannedContentMatcher(settings.banned_refresh_seconds)
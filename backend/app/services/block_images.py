@@ -0,0 +1,14 @@
+from ..models import BlockImage
+
+# A re-upload adds a BlockImage row without bumping moderation_version,
+# so created_at breaks ties: the latest image is the greatest (version, created_at).
+
+
+def image_version(image=BlockImage) -> tuple:
+    """Columns ordering a block's images oldest to newest (works on aliases too)"""
+    return image.moderation_version, image.created_at
+
+
+def latest_image_first(image=BlockImage) -> list:
+    """ORDER BY clauses putting a block's newest image first"""
+    return [column.desc() for column in image_version(image)]
@@ -0,0 +1,104 @@
+import threading
+import boto3
+import httpx
+import openai
+import requests
+import stripe
+from botocore.config import Config
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class ClientRegistry:
+    """
+    One set of AWS, OpenAI and Stripe clients per worker process.
+
+    Building a boto3 client resolves credentials, loads service models and
+    opens a new connection pool, so services share these instead of making
+    their own. Clients are thread-safe and created on first use; the app
+    lifespan warms them at startup and closes them on shutdown.
+    """
+
+    def __init__(self, pool_size: int, timeout_seconds: float):
+        self.pool_size = pool_size
+        self.timeout_seconds = timeout_seconds
+        self._lock = threading.Lock()
+        self._s3 = None
+        self._rekognition = None
+        self._openai: openai.OpenAI | None = None
+        self._stripe_session: requests.Session | None = None
+
+    def _aws_client(self, service: str):
+        session = boto3.session.Session(
+            aws_access_key_id=settings.aws_access_key_id,
+            aws_secret_access_key=settings.aws_secret_access_key,
+            region_name=settings.aws_region
+        )
+        return session.client(service, config=Config(
+            max_pool_connections=self.pool_size,
+            tcp_keepalive=True,
+            connect_timeout=self.timeout_seconds,
+            read_timeout=self.timeout_seconds,
+            retries={'mode': 'standard', 'max_attempts': 3}
+        ))
+
+    @property
+    def s3(self):
+        if self._s3 is None:
+            with self._lock:
+                if self._s3 is None:
+                    self._s3 = self._aws_client('s3')
+        return self._s3
+
+    @property
+    def rekognition(self):
+        if self._rekognition is None:
+            with self._lock:
+                if self._rekognition is None:
+                    self._rekognition = self._aws_client('rekognition')
+        return self._rekognition
+
+    @property
+    def openai(self) -> openai.OpenAI:
+        if self._openai is None:
+            with self._lock:
+                if self._openai is None:
+                    self._openai = openai.OpenAI(
+                        api_key=settings.openai_api_key,
+                        http_client=httpx.Client(
+                            limits=httpx.Limits(
+                                max_connections=self.pool_size,
+                                max_keepalive_connections=self.pool_size
+                            ),
+                            timeout=self.timeout_seconds
+                        )
+                    )
+        return self._openai
+
+    def start(self):
+        """Create every client up front so the first requests don't pay for it"""
+        self.s3
+        self.rekognition
+        self.openai
+
+        # Stripe keeps a module-level HTTP client; give it a pooled keep-alive session
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+        session.mount('https://', adapter)
+        self._stripe_session = session
+        stripe.default_http_client = stripe.RequestsClient(timeout=int(self.timeout_seconds), session=session)
+
+    def close(self):
+        with self._lock:
+            if self._openai is not None:
+                self._openai.close()
+            if self._stripe_session is not None:
+                self._stripe_session.close()
+            for client in (self._s3, self._rekognition):
+                if client is not None:
+                    client.close()
+            self._s3 = self._rekognition = self._openai = self._stripe_session = None
+
+
+client_registry = ClientRegistry(settings.client_pool_size, settings.client_timeout_seconds)
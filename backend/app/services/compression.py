@@ -0,0 +1,51 @@
+import zlib
+from ..config import get_settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+settings = get_settings()
+
+# Content codings we can produce, most preferred first
+SUPPORTED_ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encoding: str) -> str | None:
+    """Best supported coding an Accept-Encoding header allows (q=0 excludes), or None"""
+    accepted = set()
+    for item in accept_encoding.lower().split(','):
+        coding, _, params = item.partition(';')
+        q = params.strip().removeprefix('q=')
+        if q and q.replace('.', '', 1).isdigit() and float(q) == 0:
+            continue
+        accepted.add(coding.strip())
+
+    for coding in SUPPORTED_ENCODINGS:
+        if coding in accepted or '*' in accepted:
+            return coding
+    return None
+
+
+class Compressor:
+    """Incremental gzip or brotli encoder with a common compress/finish interface"""
+
+    def __init__(self, encoding: str):
+        if encoding == 'br':
+            self._encoder = brotli.Compressor(quality=settings.compression_brotli_quality)
+            self._compress, self._finish = self._encoder.process, self._encoder.finish
+        else:
+            self._encoder = zlib.compressobj(settings.compression_gzip_level, zlib.DEFLATED, 31)
+            self._compress, self._finish = self._encoder.compress, self._encoder.flush
+
+    def compress(self, data: bytes) -> bytes:
+        return self._compress(data)
+
+    def finish(self) -> bytes:
+        return self._finish()
+
+
+def compress(data: bytes, encoding: str) -> bytes:
+    compressor = Compressor(encoding)
+    return compressor.compress(data) + compressor.finish()
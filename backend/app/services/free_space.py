@@ -0,0 +1,85 @@
+import numpy as np
+from .occupancy import summed_area_table
+
+
+def _position_sums(sat: np.ndarray, rows: int, cols: int) -> np.ndarray:
+    """Window sums of a rows x cols window at every top-left cell, as a 2D array"""
+    return sat[rows:, cols:] - sat[:-rows, cols:] - sat[rows:, :-cols] + sat[:-rows, :-cols]
+
+
+def find_positions(blocked: np.ndarray, cell_prices: np.ndarray, cell_size: int, width: int, height: int,
+                   limit: int = 5, near: tuple[int, int] | None = None) -> dict:
+    """
+    Candidate top-left positions for a width x height block on free cells.
+
+    Every cell-aligned placement is tested at once from a summed-area table
+    of the blocked-cell mask, so the cost does not depend on how much of the
+    grid is sold. Returns the total number of free positions and up to
+    `limit` candidates per strategy: first_fit (row-major), cheapest and,
+    when `near` is given, closest (block center to the point).
+    """
+    rows, cols = height // cell_size, width // cell_size
+    grid_rows, grid_cols = blocked.shape
+    if rows > grid_rows or cols > grid_cols:
+        return {'available_positions': 0, 'candidates': []}
+
+    free = _position_sums(summed_area_table(blocked), rows, cols) == 0
+    positions = np.flatnonzero(free)
+    if positions.size == 0:
+        return {'available_positions': 0, 'candidates': []}
+
+    pixel_area = cell_size * cell_size
+    prices = _position_sums(summed_area_table(cell_prices), rows, cols).ravel()[positions] * pixel_area
+    pos_rows, pos_cols = np.divmod(positions, free.shape[1])
+
+    rankings = {
+        'first_fit': np.arange(positions.size),
+        'cheapest': np.argsort(prices, kind='stable'),
+    }
+    if near is not None:
+        center_x = pos_cols * cell_size + width / 2
+        center_y = pos_rows * cell_size + height / 2
+        distance = np.hypot(center_x - near[0], center_y - near[1])
+        rankings['closest'] = np.argsort(distance, kind='stable')
+
+    candidates = []
+    for strategy, order in rankings.items():
+        for i in order[:limit].tolist():
+            candidates.append({
+                'strategy': strategy,
+                'x_start': int(pos_cols[i]) * cell_size,
+                'y_start': int(pos_rows[i]) * cell_size,
+                'width': width,
+                'height': height,
+                'total_price': round(float(prices[i]), 2),
+            })
+
+    return {'available_positions': int(positions.size), 'candidates': candidates}
+
+
+def largest_empty_rectangle(blocked: np.ndarray) -> tuple[int, int, int, int] | None:
+    """
+    Largest all-free rectangle as (row, col, rows, cols) in cells, or None if
+    the grid is full. Classic histogram-and-stack scan, O(rows * cols).
+    """
+    grid_rows, grid_cols = blocked.shape
+    heights = np.zeros(grid_cols, dtype=np.int64)
+    best_area, best = 0, None
+
+    for row in range(grid_rows):
+        # Free cells stacked upwards ending at this row
+        heights = np.where(blocked[row], 0, heights + 1)
+        stack: list[int] = []
+        column_heights = heights.tolist() + [0]
+        for col, height in enumerate(column_heights):
+            while stack and column_heights[stack[-1]] >= height:
+                top = stack.pop()
+                top_height = column_heights[top]
+                left = stack[-1] + 1 if stack else 0
+                area = top_height * (col - left)
+                if area > best_area:
+                    best_area = area
+                    best = (row - top_height + 1, left, top_height, col - left)
+            stack.append(col)
+
+    return best
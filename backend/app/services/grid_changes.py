@@ -0,0 +1,72 @@
+import secrets
+import threading
+from collections import deque
+from ..models import Block, BlockImage
+from ..config import get_settings
+from .grid_snapshot import serialize_grid_block
+
+settings = get_settings()
+
+
+class GridChangeLog:
+    """
+    Bounded, in-process log of changes to the set of approved blocks.
+
+    Every entry carries a global sequence number; the sequence is also the
+    grid version reported by GET /blocks/grid, so a client can fetch the
+    snapshot once and then follow the log from that version. The epoch
+    changes on every restart so stale cursors are detected.
+    """
+
+    def __init__(self, retention: int):
+        self.epoch = secrets.token_hex(8)
+        self._entries: deque[dict] = deque(maxlen=retention)
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    @property
+    def latest_seq(self) -> int:
+        return self._seq
+
+    def record(self, block: Block, previous_status: str | None, image: BlockImage | None) -> dict:
+        """Append the change implied by a status transition and return the entry"""
+        if block.status == 'approved':
+            op = 'updated' if previous_status == 'approved' else 'added'
+            payload = serialize_grid_block(block, image)
+        else:
+            op = 'removed'
+            payload = None
+
+        with self._lock:
+            self._seq += 1
+            entry = {
+                'seq': self._seq,
+                'op': op,
+                'block_id': block.id,
+                'block': payload,
+            }
+            self._entries.append(entry)
+            return entry
+
+    def since(self, seq: int, epoch: str | None = None) -> tuple[bool, list[dict]]:
+        """
+        Return (resync_required, changes after seq).
+        A resync is required when the cursor is from another epoch, is ahead
+        of the log, or points before the oldest retained entry.
+        """
+        with self._lock:
+            if epoch is not None and epoch != self.epoch:
+                return True, []
+            if seq > self._seq or seq < 0:
+                return True, []
+            if seq == self._seq:
+                return False, []
+
+            oldest = self._entries[0]['seq'] if self._entries else self._seq + 1
+            if seq < oldest - 1:
+                return True, []
+
+            return False, [entry for entry in self._entries if entry['seq'] > seq]
+
+
+grid_change_log = GridChangeLog(settings.grid_change_retention)
@@ -0,0 +1,44 @@
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Block, BlockImage
+from .occupancy import occupancy_index
+from .block_images import latest_image_first
+from .tiles import tile_service
+from .grid_snapshot import grid_snapshot_cache
+from .grid_changes import grid_change_log
+from .grid_hub import grid_hub
+
+
+async def block_status_changed(db: AsyncSession, block: Block, previous_status: str | None):
+    """Propagate a committed block status change to the in-memory grid state"""
+    occupancy_index.apply(block)
+
+    if 'approved' in (previous_status, block.status):
+        image = None
+        if block.status == 'approved':
+            result = await db.execute(select(BlockImage).where(
+                BlockImage.block_id == block.id
+            ).order_by(*latest_image_first()).limit(1))
+            image = result.scalars().first()
+
+        entry = grid_change_log.record(block, previous_status, image)
+        grid_snapshot_cache.invalidate(entry['seq'])
+        grid_hub.publish_change(entry)
+        tile_service.schedule_block(block, image.image_url if image else None)
+
+
+def block_reserved(block: Block):
+    """Hold a new draft's area and announce it to live viewers"""
+    occupancy_index.apply(block)
+    grid_hub.publish('reserved', {
+        'block_id': block.id,
+        'x_start': block.x_start,
+        'y_start': block.y_start,
+        'width': block.width,
+        'height': block.height,
+    })
+
+
+def block_released(block: Block):
+    """Announce that a draft's reservation hold expired"""
+    grid_hub.publish('released', {'block_id': block.id})
@@ -0,0 +1,154 @@
+import asyncio
+import json
+from ..config import get_settings
+from .grid_changes import grid_change_log
+
+settings = get_settings()
+
+
+def format_sse(event: str, data: dict, event_id: str | None = None) -> bytes:
+    """Encode one server-sent event frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    lines.append(f"data: {json.dumps(data, separators=(',', ':'), default=str)}")
+    return ('\n'.join(lines) + '\n\n').encode()
+
+
+RESYNC_FRAME = format_sse('resync', {'reason': 'too far behind, refetch /blocks/grid'})
+KEEPALIVE_FRAME = b': keepalive\n\n'
+# Queued by close(): ends a stream without sending anything
+CLOSE_FRAME = object()
+
+
+class GridHub:
+    """
+    In-process fan-out of grid events to server-sent event streams.
+
+    Each event is encoded once and the same bytes are queued for every
+    subscriber. Queues are bounded: a subscriber that falls behind has its
+    backlog dropped and receives a single resync event before its stream
+    is closed, so the client refetches the grid instead of us buffering.
+    close() ends every stream at server shutdown; clients reconnect with
+    Last-Event-ID once the server is back.
+    """
+
+    def __init__(self, queue_size: int, heartbeat_seconds: int):
+        self.queue_size = max(queue_size, 2)
+        self.heartbeat_seconds = heartbeat_seconds
+        self._subscribers: set[asyncio.Queue] = set()
+        self._loop: asyncio.AbstractEventLoop | None = None
+        self._closed = False
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self._closed = False
+
+    def close(self):
+        """End every open stream and refuse new ones; safe to call from any thread or signal handler"""
+        if self._loop is None or self._closed:
+            return
+        self._closed = True
+        self._loop.call_soon_threadsafe(self._close_subscribers)
+
+    def publish(self, event: str, data: dict, seq: int | None = None):
+        """Queue an event for every subscriber; safe to call from any thread"""
+        if self._loop is None:
+            return
+
+        event_id = f"{grid_change_log.epoch}:{seq}" if seq is not None else None
+        item = (seq, format_sse(event, data, event_id))
+
+        try:
+            running = asyncio.get_running_loop()
+        except RuntimeError:
+            running = None
+
+        if running is self._loop:
+            self._fanout(item)
+        else:
+            self._loop.call_soon_threadsafe(self._fanout, item)
+
+    def publish_change(self, entry: dict):
+        self.publish(entry['op'], entry, entry['seq'])
+
+    def _fanout(self, item: tuple[int | None, bytes]):
+        for queue in list(self._subscribers):
+            try:
+                queue.put_nowait(item)
+            except asyncio.QueueFull:
+                self._subscribers.discard(queue)
+                while not queue.empty():
+                    queue.get_nowait()
+                queue.put_nowait((None, RESYNC_FRAME))
+
+    def _close_subscribers(self):
+        for queue in list(self._subscribers):
+            self._subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait((None, CLOSE_FRAME))
+
+    def _replay(self, last_event_id: str | None) -> tuple[int, list[bytes]]:
+        """Frames a (re)connecting client needs before live events, plus the last seq they cover"""
+        latest_seq = grid_change_log.latest_seq
+        hello = format_sse('hello', {'epoch': grid_change_log.epoch, 'latest_seq': latest_seq})
+
+        if not last_event_id:
+            return latest_seq, [hello]
+
+        epoch, _, seq = last_event_id.partition(':')
+        if not seq.isdigit():
+            return latest_seq, [hello, RESYNC_FRAME]
+
+        resync_required, changes = grid_change_log.since(int(seq), epoch)
+        if resync_required:
+            return latest_seq, [hello, RESYNC_FRAME]
+
+        frames = [hello]
+        for entry in changes:
+            frames.append(format_sse(entry['op'], entry, f"{grid_change_log.epoch}:{entry['seq']}"))
+        return (changes[-1]['seq'] if changes else int(seq)), frames
+
+    async def stream(self, last_event_id: str | None = None):
+        """Async iterator of SSE frames for one client"""
+        if self._closed:
+            return
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.queue_size)
+        # Subscribe before replaying so nothing falls in between
+        self._subscribers.add(queue)
+        try:
+            last_seq, frames = self._replay(last_event_id)
+            for frame in frames:
+                yield frame
+                if frame is RESYNC_FRAME:
+                    return
+
+            while True:
+                try:
+                    seq, frame = await asyncio.wait_for(queue.get(), timeout=self.heartbeat_seconds)
+                except asyncio.TimeoutError:
+                    yield KEEPALIVE_FRAME
+                    continue
+
+                if frame is CLOSE_FRAME:
+                    return
+                if seq is not None:
+                    if seq <= last_seq:
+                        continue
+                    last_seq = seq
+
+                yield frame
+                if frame is RESYNC_FRAME:
+                    return
+        finally:
+            self._subscribers.discard(queue)
+
+
+grid_hub = GridHub(settings.grid_stream_queue_size, settings.grid_stream_heartbeat_seconds)
@@ -0,0 +1,96 @@
+import hashlib
+import threading
+import orjson
+from dataclasses import dataclass
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Block, BlockImage
+from .block_images import image_version
+from .compression import SUPPORTED_ENCODINGS, compress
+
+
+def serialize_grid_block(block: Block, image: BlockImage | None) -> dict:
+    """JSON-ready grid entry for a block and its latest image"""
+    return {
+        'id': str(block.id),
+        'x_start': block.x_start,
+        'y_start': block.y_start,
+        'width': block.width,
+        'height': block.height,
+        'image_url': image.image_url if image else None,
+        'image_variants': image.image_variants if image else None,
+        'link_url': block.link_url,
+        'hover_title': image.hover_title if image else None,
+        'hover_description': image.hover_description if image else None,
+        'hover_cta': image.hover_cta if image else None,
+    }
+
+
+@dataclass(frozen=True)
+class GridSnapshot:
+    version: int
+    body: bytes
+    encoded_bodies: dict[str, bytes]  # content coding -> compressed body
+    etag: str
+
+
+class GridSnapshotCache:
+    """
+    Pre-encoded JSON of every approved block, rebuilt only after a block
+    enters or leaves 'approved'. Steady-state reads never touch the DB.
+    The version is the grid change log sequence the snapshot reflects.
+    """
+
+    def __init__(self):
+        self._version = 0
+        self._snapshot: GridSnapshot | None = None
+        self._lock = threading.Lock()
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def invalidate(self, version: int):
+        with self._lock:
+            self._version = version
+            self._snapshot = None
+
+    async def get(self, db: AsyncSession) -> GridSnapshot:
+        snapshot = self._snapshot
+        if snapshot is not None:
+            return snapshot
+
+        version = self._version
+        snapshot = await self._build(db, version)
+
+        with self._lock:
+            # Don't cache a snapshot that was invalidated while building
+            if self._version == version:
+                self._snapshot = snapshot
+        return snapshot
+
+    async def _build(self, db: AsyncSession, version: int) -> GridSnapshot:
+        result = await db.execute(select(Block, BlockImage).outerjoin(
+            BlockImage, BlockImage.block_id == Block.id
+        ).where(
+            Block.status == 'approved'
+        ).order_by(Block.id, *image_version()))
+        rows = result.all()
+
+        # Later image versions overwrite earlier ones
+        grid_blocks = {}
+        for block, image in rows:
+            grid_blocks[block.id] = serialize_grid_block(block, image)
+
+        body = orjson.dumps(list(grid_blocks.values()))
+        digest = hashlib.sha256(body).hexdigest()[:16]
+
+        return GridSnapshot(
+            version=version,
+            body=body,
+            encoded_bodies={encoding: compress(body, encoding) for encoding in SUPPORTED_ENCODINGS},
+            etag=f'W/"{version}-{digest}"'
+        )
+
+
+grid_snapshot_cache = GridSnapshotCache()
@@ -0,0 +1,66 @@
+import asyncio
+import multiprocessing
+from typing import BinaryIO
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from ..config import get_settings
+from .storage import ProcessedImage, process_image
+
+settings = get_settings()
+
+
+class ImageProcessingPool:
+    """
+    Runs Pillow decode/resize/encode in worker processes so CPU-heavy uploads
+    never block the event loop. At most `workers` images are processed at
+    once; further uploads wait here rather than queueing their bytes in the
+    executor.
+    """
+
+    def __init__(self, workers: int, max_pixels: int):
+        self.workers = workers
+        self.max_pixels = max_pixels
+        self._executor: ProcessPoolExecutor | None = None
+        self._slots: asyncio.Semaphore | None = None
+
+    def start(self):
+        self._executor = self._new_executor()
+        self._slots = asyncio.Semaphore(self.workers)
+
+    def _new_executor(self) -> ProcessPoolExecutor:
+        # Spawned, not forked: by the first upload the server already runs threads
+        # (executors, client pools) whose held locks a forked child would inherit
+        return ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context('spawn')
+        )
+
+    def stop(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    async def process(self, source: BinaryIO, width: int, height: int) -> ProcessedImage:
+        """
+        Process an uploaded file for a width x height block; raises ValueError for bad images
+        Raises BrokenProcessPool if a worker died mid-task; the pool is replaced for later uploads
+        """
+        async with self._slots:
+            # Worker processes cannot share the file, so its contents travel with the task
+            image_bytes = await asyncio.to_thread(source.read)
+            loop = asyncio.get_running_loop()
+            executor = self._executor
+            try:
+                return await loop.run_in_executor(
+                    executor, process_image, image_bytes, width, height, self.max_pixels
+                )
+            except BrokenProcessPool:
+                # Not retried: the image itself may be what killed the worker.
+                # Concurrent failures share one broken executor, so only the first replaces it
+                if self._executor is executor:
+                    print("Image worker died, restarting the processing pool")
+                    executor.shutdown(wait=False, cancel_futures=True)
+                    self._executor = self._new_executor()
+                raise
+
+
+image_pool = ImageProcessingPool(settings.image_workers, settings.max_image_pixels)
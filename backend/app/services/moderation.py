@@ -1,66 +1,68 @@
+import asyncio
 import hashlib
 import io
-import re
+import uuid
 from PIL import Image
-import boto3
-import openai
-from sqlalchemy.orm import Session
-from ..models import ModerationCheck, BannedContent, BlockImage
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import ModerationCheck, BlockImage
 from ..config import get_settings
+from .banned_matcher import banned_matcher, CompiledBans
+from .moderation_cache import moderation_cache
+from .clients import ClientRegistry, client_registry
 import requests
 
 settings = get_settings()
-openai.api_key = settings.openai_api_key
 
 
 class ModerationService:
-    def __init__(self, db: Session):
+    def __init__(self, db: AsyncSession, clients: ClientRegistry | None = None):
         self.db = db
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_region
-        )
-        self.rekognition_client = boto3.client(
-            'rekognition',
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_region
-        )
+        clients = clients or client_registry
+        self.s3_client = clients.s3
+        self.rekognition_client = clients.rekognition
+        self.openai_client = clients.openai
 
     def calculate_image_hash(self, image_bytes: bytes) -> str:
         """Calculate SHA256 hash of image"""
         return hashlib.sha256(image_bytes).hexdigest()
 
-    def check_banned_hash(self, image_hash: str) -> bool:
+    async def check_banned_hash(self, image_hash: str) -> bool:
         """Check if image hash is banned"""
-        banned = self.db.query(BannedContent).filter(
-            BannedContent.ban_type == 'image_hash',
-            BannedContent.value == image_hash
-        ).first()
-        return banned is not None
-
-    def check_banned_domain(self, url: str) -> bool:
-        """Check if URL domain is banned"""
-        domain = re.search(r'https?://([^/]+)', url)
-        if not domain:
-            return False
-
-        domain_name = domain.group(1).lower()
-        banned = self.db.query(BannedContent).filter(
-            BannedContent.ban_type == 'domain'
-        ).all()
-
-        for ban in banned:
-            if ban.value.lower() in domain_name:
-                return True
-        return False
+        return (await banned_matcher.get(self.db)).is_hash_banned(image_hash)
+
+    async def check_banned_perceptual_hash(self, perceptual_hash: str | None) -> bool:
+        """Check if image is a near-duplicate of a banned image"""
+        return (await banned_matcher.get(self.db)).is_near_duplicate_banned(
+            perceptual_hash, settings.perceptual_hash_max_distance
+        )
+
+    async def check_banned_domain(self, url: str) -> bool:
+        """Check if URL host is a banned domain or one of its subdomains"""
+        return (await banned_matcher.get(self.db)).is_domain_banned(url)
+
+    async def record_cached_check(self, check_type: str, verdict: dict, block_image_id: str) -> dict:
+        """Record a reused verdict as a check on this image, pointing at the original check"""
+        check = ModerationCheck(
+            block_image_id=block_image_id,
+            check_type=check_type,
+            result={**verdict['result'], 'cached_from': verdict['check_id']},
+            flagged=verdict['flagged'],
+            confidence=verdict['confidence'],
+            flagged_categories=verdict['flagged_categories'] or None
+        )
+        self.db.add(check)
+
+        return {
+            'flagged': verdict['flagged'],
+            'categories': verdict['flagged_categories'],
+            'cached': True
+        }
 
     async def moderate_image_openai(self, image_url: str, block_image_id: str) -> dict:
         """Run OpenAI image moderation"""
         try:
-            response = openai.moderations.create(
+            response = await asyncio.to_thread(
+                self.openai_client.moderations.create,
                 input=image_url
             )
             result = response.results[0]
@@ -79,7 +81,6 @@ class ModerationService:
                 flagged_categories=flagged_categories if flagged_categories else None
             )
             self.db.add(check)
-            self.db.commit()
 
             return {
                 'flagged': result.flagged,
@@ -92,7 +93,8 @@ class ModerationService:
     async def moderate_image_rekognition(self, s3_key: str, block_image_id: str) -> dict:
         """Run AWS Rekognition moderation"""
         try:
-            response = self.rekognition_client.detect_moderation_labels(
+            response = await asyncio.to_thread(
+                self.rekognition_client.detect_moderation_labels,
                 Image={
                     'S3Object': {
                         'Bucket': settings.s3_bucket_name,
@@ -120,7 +122,6 @@ class ModerationService:
                 flagged_categories=flagged_categories if flagged_categories else None
             )
             self.db.add(check)
-            self.db.commit()
 
             return {
                 'flagged': is_flagged,
@@ -131,23 +132,25 @@ class ModerationService:
             print(f"Rekognition moderation error: {e}")
             return {'flagged': False, 'categories': [], 'error': str(e)}
 
-    async def moderate_url(self, url: str, block_image_id: str) -> dict:
+    async def moderate_url(self, url: str, block_image_id: str, bans: CompiledBans | None = None) -> dict:
         """Check URL against Google Safe Browsing"""
         try:
             # Simplified URL check - in production use Google Safe Browsing API
             # https://developers.google.com/safe-browsing/v4
+            bans = bans or await banned_matcher.get(self.db)
+            cached = moderation_cache.lookup_url(url, bans.generation)
+            if cached:
+                return await self.record_cached_check('url_scan', cached, block_image_id)
 
             # Check against banned domains first
-            is_banned = self.check_banned_domain(url)
+            is_banned = bans.is_domain_banned(url)
 
-            # Check for suspicious patterns
-            suspicious_keywords = ['casino', 'porn', 'xxx', 'adult', 'bitcoin', 'crypto', 'free-money']
-            url_lower = url.lower()
-
-            flagged_keywords = [kw for kw in suspicious_keywords if kw in url_lower]
+            # Check for suspicious patterns and banned keywords
+            flagged_keywords = bans.url_keywords.search(url)
             is_flagged = is_banned or len(flagged_keywords) > 0
 
             check = ModerationCheck(
+                id=uuid.uuid4(),
                 block_image_id=block_image_id,
                 check_type='url_scan',
                 result={
@@ -160,7 +163,7 @@ class ModerationService:
                 flagged_categories=['banned_domain'] if is_banned else flagged_keywords
             )
             self.db.add(check)
-            self.db.commit()
+            moderation_cache.store_url(url, bans.generation, check)
 
             return {
                 'flagged': is_flagged,
@@ -170,52 +173,49 @@ class ModerationService:
             print(f"URL moderation error: {e}")
             return {'flagged': False, 'categories': [], 'error': str(e)}
 
-    async def moderate_text_ocr(self, image_bytes: bytes, block_image_id: str) -> dict:
-        """Extract and moderate text from image using Rekognition OCR"""
+    async def moderate_text_ocr(self, image_bytes: bytes, block_image_id: str, cached: dict | None = None,
+                                bans: CompiledBans | None = None) -> dict:
+        """
+        Extract and moderate text from image using Rekognition OCR
+        With a cached verdict the earlier extracted text is re-checked against current keywords
+        """
         try:
-            response = self.rekognition_client.detect_text(
-                Image={'Bytes': image_bytes}
-            )
-
-            extracted_text = ' '.join([
-                detection['DetectedText']
-                for detection in response.get('TextDetections', [])
-                if detection['Type'] == 'LINE'
-            ])
-
-            # Check for banned keywords
-            banned_keywords = self.db.query(BannedContent).filter(
-                BannedContent.ban_type == 'keyword'
-            ).all()
-
-            flagged_keywords = []
-            text_lower = extracted_text.lower()
-
-            for banned in banned_keywords:
-                if banned.value.lower() in text_lower:
-                    flagged_keywords.append(banned.value)
-
-            # Additional hardcoded checks
-            explicit_keywords = ['porn', 'xxx', 'sex', 'adult', 'casino', 'bitcoin', 'crypto']
-            for keyword in explicit_keywords:
-                if keyword in text_lower and keyword not in flagged_keywords:
-                    flagged_keywords.append(keyword)
+            if cached:
+                extracted_text = cached['result'].get('extracted_text', '')
+            else:
+                response = await asyncio.to_thread(
+                    self.rekognition_client.detect_text,
+                    Image={'Bytes': image_bytes}
+                )
+
+                extracted_text = ' '.join([
+                    detection['DetectedText']
+                    for detection in response.get('TextDetections', [])
+                    if detection['Type'] == 'LINE'
+                ])
+
+            # Check for banned and explicit keywords
+            bans = bans or await banned_matcher.get(self.db)
+            flagged_keywords = bans.text_keywords.search(extracted_text)
 
             is_flagged = len(flagged_keywords) > 0
 
+            result = {
+                'extracted_text': extracted_text,
+                'flagged_keywords': flagged_keywords
+            }
+            if cached:
+                result['cached_from'] = cached['check_id']
+
             check = ModerationCheck(
                 block_image_id=block_image_id,
                 check_type='ocr_text',
-                result={
-                    'extracted_text': extracted_text,
-                    'flagged_keywords': flagged_keywords
-                },
+                result=result,
                 flagged=is_flagged,
                 confidence=0.9 if is_flagged else None,
                 flagged_categories=flagged_keywords if flagged_keywords else None
             )
             self.db.add(check)
-            self.db.commit()
 
             return {
                 'flagged': is_flagged,
@@ -226,12 +226,13 @@ class ModerationService:
             print(f"OCR moderation error: {e}")
             return {'flagged': False, 'categories': [], 'error': str(e)}
 
-    async def run_full_moderation(self, image_bytes: bytes, s3_key: str, link_url: str, block_image_id: str) -> dict:
-        """Run all moderation checks"""
-        image_hash = self.calculate_image_hash(image_bytes)
+    async def run_full_moderation(self, image_bytes: bytes, s3_key: str, link_url: str, block_image_id: str,
+                                  image_hash: str | None = None) -> dict:
+        """Run all moderation checks (pass image_hash when the caller already computed it)"""
+        image_hash = image_hash or self.calculate_image_hash(image_bytes)
 
         # Check banned hash first
-        if self.check_banned_hash(image_hash):
+        if await self.check_banned_hash(image_hash):
             return {
                 'auto_approve': False,
                 'flagged': True,
@@ -239,27 +240,39 @@ class ModerationService:
                 'checks': []
             }
 
-        # Run all checks
-        checks = []
+        # Reuse verdicts for an identical image instead of calling providers again
+        cached = await moderation_cache.lookup_image(self.db, image_hash)
+        # Resolve DB-backed state up front: the session must not be used by the concurrent checks
+        bans = await banned_matcher.get(self.db)
+
+        if 'openai_image' in cached:
+            openai_check = self.record_cached_check('openai_image', cached['openai_image'], block_image_id)
+        else:
+            openai_check = self.moderate_image_openai(
+                f"https://{settings.s3_bucket_name}.s3.amazonaws.com/{s3_key}",
+                block_image_id
+            )
 
-        # OpenAI
-        openai_result = await self.moderate_image_openai(
-            f"https://{settings.s3_bucket_name}.s3.amazonaws.com/{s3_key}",
-            block_image_id
+        if 'aws_rekognition' in cached:
+            rekognition_check = self.record_cached_check('aws_rekognition', cached['aws_rekognition'], block_image_id)
+        else:
+            rekognition_check = self.moderate_image_rekognition(s3_key, block_image_id)
+
+        # Run all checks concurrently; provider SDK calls run in worker threads
+        openai_result, rekognition_result, ocr_result, url_result = await asyncio.gather(
+            openai_check,
+            rekognition_check,
+            self.moderate_text_ocr(image_bytes, block_image_id, cached.get('ocr_text'), bans),
+            self.moderate_url(link_url, block_image_id, bans)
         )
-        checks.append(('openai', openai_result))
-
-        # AWS Rekognition
-        rekognition_result = await self.moderate_image_rekognition(s3_key, block_image_id)
-        checks.append(('rekognition', rekognition_result))
-
-        # OCR text
-        ocr_result = await self.moderate_text_ocr(image_bytes, block_image_id)
-        checks.append(('ocr', ocr_result))
-
-        # URL scan
-        url_result = await self.moderate_url(link_url, block_image_id)
-        checks.append(('url', url_result))
+        await self.db.commit()
+
+        checks = [
+            ('openai', openai_result),
+            ('rekognition', rekognition_result),
+            ('ocr', ocr_result),
+            ('url', url_result),
+        ]
 
         # Determine if auto-approve is safe
         any_flagged = any(check[1].get('flagged', False) for check in checks)
@@ -0,0 +1,97 @@
+from urllib.parse import urlsplit, urlunsplit
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import ModerationCheck, BlockImage
+from ..config import get_settings
+from .ttl_cache import TTLCache
+
+settings = get_settings()
+
+# Provider checks whose outcome depends only on the image bytes
+IMAGE_CHECK_TYPES = ('openai_image', 'aws_rekognition', 'ocr_text')
+
+_DEFAULT_PORTS = {'http': 80, 'https': 443}
+
+
+def normalize_url(url: str) -> str:
+    """Canonical form of a link URL for cache keys (case, default port, fragment)"""
+    try:
+        parts = urlsplit(url.strip())
+        host = parts.hostname or ''
+        port = parts.port
+    except ValueError:
+        return url.strip()
+
+    scheme = parts.scheme.lower()
+    netloc = host.rstrip('.')
+    if port and port != _DEFAULT_PORTS.get(scheme):
+        netloc = f"{netloc}:{port}"
+    return urlunsplit((scheme, netloc, parts.path or '/', parts.query, ''))
+
+
+def _verdict(check: ModerationCheck) -> dict:
+    result = dict(check.result or {})
+    # Always point at the check that actually called the provider
+    original_id = result.pop('cached_from', None) or str(check.id)
+    return {
+        'check_id': original_id,
+        'result': result,
+        'flagged': check.flagged,
+        'confidence': float(check.confidence) if check.confidence is not None else None,
+        'flagged_categories': list(check.flagged_categories or []),
+    }
+
+
+class ModerationVerdictCache:
+    """
+    Earlier moderation verdicts for identical content, so providers are only
+    called for new images and links.
+
+    Image verdicts are keyed by SHA-256 and backed by the moderation_checks
+    table, with an in-process LRU (with TTL) in front. URL scans are keyed by
+    normalized URL plus the banned-content generation they were evaluated
+    against, so a new ban invalidates them.
+    """
+
+    def __init__(self, maxsize: int, ttl_seconds: int):
+        self._images = TTLCache(maxsize, ttl_seconds)
+        self._urls = TTLCache(maxsize, ttl_seconds)
+
+    async def lookup_image(self, db: AsyncSession, image_hash: str) -> dict[str, dict]:
+        """Return {check_type: verdict} for every image check already run on this hash"""
+        verdicts = {}
+        missing = []
+        for check_type in IMAGE_CHECK_TYPES:
+            verdict = self._images.get((check_type, image_hash))
+            if verdict is None:
+                missing.append(check_type)
+            else:
+                verdicts[check_type] = verdict
+
+        if missing:
+            # Latest check of each missing type, in one query
+            result = await db.execute(select(ModerationCheck).join(
+                BlockImage, BlockImage.id == ModerationCheck.block_image_id
+            ).where(
+                BlockImage.image_hash == image_hash,
+                ModerationCheck.check_type.in_(missing)
+            ).order_by(
+                ModerationCheck.check_type, ModerationCheck.checked_at.desc()
+            ).distinct(ModerationCheck.check_type))
+            checks = result.scalars().all()
+
+            for check in checks:
+                verdict = _verdict(check)
+                self._images.set((check.check_type, image_hash), verdict)
+                verdicts[check.check_type] = verdict
+
+        return verdicts
+
+    def lookup_url(self, url: str, bans_generation: int) -> dict | None:
+        return self._urls.get((normalize_url(url), bans_generation))
+
+    def store_url(self, url: str, bans_generation: int, check: ModerationCheck):
+        self._urls.set((normalize_url(url), bans_generation), _verdict(check))
+
+
+moderation_cache = ModerationVerdictCache(settings.moderation_cache_size, settings.moderation_cache_ttl_seconds)
@@ -0,0 +1,233 @@
+import asyncio
+from collections import OrderedDict
+from datetime import datetime
+from uuid import UUID
+from sqlalchemy import select, update, exists, tuple_
+from sqlalchemy.orm import aliased
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import SessionLocal, is_exclusion_violation
+from ..models import Block, BlockImage, ModerationCheck
+from ..config import get_settings
+from .moderation import ModerationService
+from .grid_events import block_status_changed, block_released
+from .occupancy import holds_area, has_active_payment
+from .storage import StorageService
+from .block_images import image_version
+
+settings = get_settings()
+
+
+class BlockUnavailable(Exception):
+    """The block can no longer take the moderation outcome; the message is safe to show clients"""
+
+
+class ModerationJob:
+    """One uploaded image waiting for (or going through) automated moderation"""
+
+    def __init__(self, block_id: UUID, block_image_id: UUID, image_bytes: bytes | None, s3_key: str,
+                 link_url: str, image_hash: str | None = None):
+        # A job moderates exactly one BlockImage, so they share an id
+        self.id = block_image_id
+        self.block_id = block_id
+        self.block_image_id = block_image_id
+        self.image_bytes = image_bytes
+        self.s3_key = s3_key
+        self.link_url = link_url
+        self.image_hash = image_hash
+        self.status = 'queued'
+        self.block_status: str | None = None
+        self.flagged: bool | None = None
+        self.error: str | None = None
+        self.created_at = datetime.utcnow()
+        self.finished_at: datetime | None = None
+        self.done = asyncio.Event()
+
+    def to_dict(self) -> dict:
+        return {
+            'job_id': self.id,
+            'block_id': self.block_id,
+            'block_image_id': self.block_image_id,
+            'status': self.status,
+            'block_status': self.block_status,
+            'flagged': self.flagged,
+            'error': self.error,
+        }
+
+
+class ModerationWorkerPool:
+    """
+    Fixed set of worker tasks draining a queue of moderation jobs, so uploads
+    return immediately and at most `workers` images are moderated at once.
+    Finished jobs are kept (up to `retention`) for status polling.
+
+    The queue lives in memory only: jobs still queued at shutdown are picked
+    up again at the next start, from images that have no moderation checks.
+    """
+
+    def __init__(self, workers: int, retention: int, shutdown_seconds: int):
+        self.workers = workers
+        self.retention = retention
+        self.shutdown_seconds = shutdown_seconds
+        self._queue: asyncio.Queue | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._running: set[asyncio.Task] = set()
+        self._jobs: OrderedDict[UUID, ModerationJob] = OrderedDict()
+
+    async def start(self, db: AsyncSession):
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+        for job in await self._unmoderated_jobs(db):
+            self.submit(job)
+
+    async def stop(self):
+        """Stop taking jobs and give running ones up to shutdown_seconds to finish"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+        if self._running:
+            _, unfinished = await asyncio.wait(self._running, timeout=self.shutdown_seconds)
+            for task in unfinished:
+                task.cancel()
+            await asyncio.gather(*unfinished, return_exceptions=True)
+
+    async def _unmoderated_jobs(self, db: AsyncSession) -> list[ModerationJob]:
+        """
+        Jobs lost to a restart: the latest image of every block still awaiting
+        moderation that has no check recorded. Image bytes are fetched from S3
+        when the job runs.
+        """
+        newer = aliased(BlockImage)
+        result = await db.execute(select(BlockImage).join(Block, Block.id == BlockImage.block_id).where(
+            Block.status.in_(('draft', 'pending_review')),
+            holds_area(),
+            ~exists().where(ModerationCheck.block_image_id == BlockImage.id),
+            ~exists().where(
+                newer.block_id == BlockImage.block_id,
+                tuple_(*image_version(newer)) > tuple_(*image_version())
+            )
+        ).order_by(BlockImage.created_at))
+
+        storage = StorageService()
+        jobs = []
+        for image in result.scalars().all():
+            try:
+                s3_key = storage.key_from_url(image.image_url)
+            except ValueError as e:
+                print(f"Moderation recovery error: {e}")
+                continue
+            jobs.append(ModerationJob(image.block_id, image.id, None, s3_key, image.link_url, image.image_hash))
+        return jobs
+
+    def submit(self, job: ModerationJob) -> ModerationJob:
+        self._jobs[job.id] = job
+        while len(self._jobs) > self.retention:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.done.is_set():
+                break
+            del self._jobs[oldest_id]
+
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: UUID) -> ModerationJob | None:
+        return self._jobs.get(job_id)
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            # Shielded, so stopping the worker leaves a job in progress running to completion
+            run = asyncio.create_task(self._run(job))
+            self._running.add(run)
+            run.add_done_callback(self._running.discard)
+            try:
+                await asyncio.shield(run)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: ModerationJob):
+        job.status = 'running'
+        async with SessionLocal() as db:
+            try:
+                await self._moderate(db, job)
+                job.status = 'completed'
+            except BlockUnavailable as e:
+                job.error = str(e)
+                job.status = 'failed'
+            except Exception as e:
+                # Details (SQL, provider errors) stay in the log; the job status is public
+                print(f"Moderation job {job.id} failed: {e}")
+                job.error = "Moderation failed"
+                job.status = 'failed'
+            finally:
+                job.image_bytes = None
+                job.finished_at = datetime.utcnow()
+                job.done.set()
+
+    async def _moderate(self, db: AsyncSession, job: ModerationJob):
+        if job.image_bytes is None:
+            job.image_bytes = await asyncio.to_thread(StorageService().download_object, job.s3_key)
+            if job.image_bytes is None:
+                raise RuntimeError(f"image {job.s3_key} is missing from S3")
+
+        moderation = ModerationService(db)
+        moderation_result = await moderation.run_full_moderation(
+            job.image_bytes, job.s3_key, job.link_url, str(job.block_image_id), job.image_hash
+        )
+
+        job.flagged = moderation_result['flagged']
+
+        # Only a block still holding its area moves on: once a reservation has expired or its hold
+        # lapsed, the cells may belong to another buyer. The row lock keeps the expiry sweep out meanwhile.
+        result = await db.execute(
+            select(Block).where(Block.id == job.block_id, holds_area()).with_for_update()
+        )
+        block = result.scalars().first()
+        if block is None:
+            block = await db.get(Block, job.block_id)
+            job.block_status = block.status if block else None
+            if block is None or block.status in ('draft', 'expired'):
+                raise BlockUnavailable("Reservation expired, reserve the area again")
+            raise BlockUnavailable("Block is no longer awaiting moderation")
+
+        previous_status = block.status
+        if moderation_result['auto_approve']:
+            block.status = 'approved'
+            block.approved_at = datetime.utcnow()
+        else:
+            block.status = 'pending_review'
+
+        try:
+            await db.commit()
+        except IntegrityError as e:
+            await db.rollback()
+            if not is_exclusion_violation(e):
+                raise
+            # A draft going active lost its area to an overlapping purchase: give the reservation up
+            await self._release_draft(db, job)
+            raise BlockUnavailable("Grid area is no longer available")
+        await block_status_changed(db, block, previous_status)
+
+        job.block_status = block.status
+
+    async def _release_draft(self, db: AsyncSession, job: ModerationJob):
+        result = await db.execute(
+            # A draft being paid for stays; the payment webhook settles (and refunds) it
+            update(Block).where(Block.id == job.block_id, Block.status == 'draft', ~has_active_payment())
+            .values(status='expired').returning(Block),
+            execution_options={'synchronize_session': False}
+        )
+        block = result.scalars().first()
+        await db.commit()
+        if block is not None:
+            await block_status_changed(db, block, 'draft')
+            block_released(block)
+        job.block_status = block.status if block is not None else None
+
+
+moderation_pool = ModerationWorkerPool(
+    settings.moderation_workers, settings.moderation_job_retention, settings.moderation_shutdown_seconds
+)
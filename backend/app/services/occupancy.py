@@ -0,0 +1,184 @@
+import threading
+from datetime import timedelta
+from uuid import UUID
+import numpy as np
+from sqlalchemy import select, func, or_, and_, exists
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Block, Payment
+from ..config import get_settings
+
+settings = get_settings()
+
+# Statuses that hold their area on the grid
+OCCUPYING_STATUSES = ('approved', 'pending_review')
+# Drafts hold their area too until their reservation hold expires
+HELD_STATUSES = OCCUPYING_STATUSES + ('draft',)
+
+
+def has_active_payment():
+    """SQL condition for blocks paid for, or with a checkout session that may still complete"""
+    checkout_start = func.now() - timedelta(minutes=settings.checkout_session_minutes)
+    return exists().where(
+        Payment.block_id == Block.id,
+        or_(
+            Payment.status == 'succeeded',
+            and_(Payment.status == 'pending', Payment.created_at > checkout_start)
+        )
+    )
+
+
+def holds_area():
+    """
+    SQL condition for blocks holding their area: sold, or a draft still inside
+    its hold. A draft being paid for keeps its hold until the payment settles.
+    """
+    hold_start = func.now() - timedelta(minutes=settings.reservation_hold_minutes)
+    return or_(
+        Block.status.in_(OCCUPYING_STATUSES),
+        and_(Block.status == 'draft', or_(Block.created_at > hold_start, has_active_payment()))
+    )
+
+
+def cell_ranges(rects: np.ndarray, cell_size: int, rows: int, cols: int) -> tuple[np.ndarray, ...]:
+    """Vectorized cell_range: (r0, r1, c0, c1) arrays for an (N, 4) array of x, y, width, height"""
+    x, y, w, h = rects.T
+    r0 = np.clip(y // cell_size, 0, rows)
+    r1 = np.clip(-(-(y + h) // cell_size), 0, rows)
+    c0 = np.clip(x // cell_size, 0, cols)
+    c1 = np.clip(-(-(x + w) // cell_size), 0, cols)
+    return r0, r1, c0, c1
+
+
+def summed_area_table(table: np.ndarray) -> np.ndarray:
+    """sat[r, c] = sum of table[:r, :c] (one row and column of zero padding)"""
+    sat = np.zeros((table.shape[0] + 1, table.shape[1] + 1), dtype=np.result_type(table.dtype, np.int64))
+    np.cumsum(np.cumsum(table, axis=0), axis=1, out=sat[1:, 1:])
+    return sat
+
+
+def window_sums(sat: np.ndarray, r0, r1, c0, c1) -> np.ndarray:
+    """Sum of every window [r0:r1, c0:c1] at once, read off a summed-area table"""
+    return sat[r1, c1] - sat[r0, c1] - sat[r1, c0] + sat[r0, c0]
+
+
+class OccupancyIndex:
+    """
+    In-memory cell -> block map of the grid.
+
+    Block sizes are multiples of min_block_size, so the grid is a small matrix
+    of cells (100x100 by default). Each cell stores a slot number (0 = free)
+    that maps back to the owning block id.
+    """
+
+    def __init__(self, grid_width: int, grid_height: int, cell_size: int):
+        self.cell_size = cell_size
+        self.rows = -(-grid_height // cell_size)
+        self.cols = -(-grid_width // cell_size)
+        self._lock = threading.Lock()
+        self._reset()
+        self.ready = False
+
+    def _reset(self):
+        self._cells = np.zeros((self.rows, self.cols), dtype=np.int32)
+        self._slot_by_block: dict[UUID, int] = {}
+        self._block_by_slot: dict[int, UUID] = {}
+        self._rect_by_slot: dict[int, tuple[int, int, int, int]] = {}
+        self._free_slots: list[int] = []
+        self._next_slot = 1
+
+    def cell_range(self, x_start: int, y_start: int, width: int, height: int) -> tuple[int, int, int, int]:
+        """Return (row_start, row_end, col_start, col_end) covering a pixel rectangle, clipped to the grid"""
+        cs = self.cell_size
+        r0 = min(max(0, y_start // cs), self.rows)
+        r1 = min(max(0, -(-(y_start + height) // cs)), self.rows)
+        c0 = min(max(0, x_start // cs), self.cols)
+        c1 = min(max(0, -(-(x_start + width) // cs)), self.cols)
+        return r0, r1, c0, c1
+
+    def _paint(self, slot: int, rect: tuple[int, int, int, int]):
+        r0, r1, c0, c1 = rect
+        self._cells[r0:r1, c0:c1] = slot
+
+    def _place(self, block_id: UUID, rect: tuple[int, int, int, int]):
+        slot = self._slot_by_block.get(block_id)
+        if slot is not None:
+            if self._rect_by_slot[slot] == rect:
+                return
+            self._remove(block_id)
+
+        slot = self._free_slots.pop() if self._free_slots else self._next_slot
+        if slot == self._next_slot:
+            self._next_slot += 1
+
+        self._slot_by_block[block_id] = slot
+        self._block_by_slot[slot] = block_id
+        self._rect_by_slot[slot] = rect
+        self._paint(slot, rect)
+
+    def _remove(self, block_id: UUID):
+        slot = self._slot_by_block.pop(block_id, None)
+        if slot is None:
+            return
+
+        r0, r1, c0, c1 = self._rect_by_slot.pop(slot)
+        del self._block_by_slot[slot]
+        window = self._cells[r0:r1, c0:c1]
+        window[window == slot] = 0
+        self._free_slots.append(slot)
+
+        # Legacy rows may overlap; repaint any survivors under the freed area
+        for other_slot, (o_r0, o_r1, o_c0, o_c1) in self._rect_by_slot.items():
+            if o_r0 < r1 and o_r1 > r0 and o_c0 < c1 and o_c1 > c0:
+                self._paint(other_slot, (o_r0, o_r1, o_c0, o_c1))
+
+    async def rebuild(self, db: AsyncSession):
+        """Rebuild the whole index from the blocks table (sold blocks and live holds)"""
+        result = await db.execute(select(
+            Block.id, Block.x_start, Block.y_start, Block.width, Block.height
+        ).where(holds_area()))
+        rows = result.all()
+
+        with self._lock:
+            self._reset()
+            for block_id, x_start, y_start, width, height in rows:
+                self._place(block_id, self.cell_range(x_start, y_start, width, height))
+            self.ready = True
+
+    def apply(self, block: Block):
+        """Sync a single block after it was reserved or its status changed"""
+        with self._lock:
+            if block.status in HELD_STATUSES:
+                rect = self.cell_range(block.x_start, block.y_start, block.width, block.height)
+                self._place(block.id, rect)
+            else:
+                self._remove(block.id)
+
+    def remove(self, block_id: UUID):
+        """Drop a block that no longer exists"""
+        with self._lock:
+            self._remove(block_id)
+
+    def occupied_mask(self) -> np.ndarray:
+        """Copy of the taken-cell mask (sold blocks and live holds)"""
+        with self._lock:
+            return self._cells != 0
+
+    def occupied_cells(self, rects: np.ndarray) -> np.ndarray:
+        """Number of taken cells under each rectangle of an (N, 4) array, in one pass"""
+        with self._lock:
+            occupied = self._cells != 0
+        sat = summed_area_table(occupied)
+        return window_sums(sat, *cell_ranges(rects, self.cell_size, self.rows, self.cols))
+
+    def conflicts(self, x_start: int, y_start: int, width: int, height: int) -> list[UUID]:
+        """Return ids of blocks occupying any cell of the rectangle"""
+        r0, r1, c0, c1 = self.cell_range(x_start, y_start, width, height)
+        with self._lock:
+            window = self._cells[r0:r1, c0:c1]
+            if not window.any():
+                return []
+            slots = np.unique(window[window != 0])
+            return [self._block_by_slot[int(slot)] for slot in slots]
+
+
+occupancy_index = OccupancyIndex(settings.grid_width, settings.grid_height, settings.min_block_size)
@@ -0,0 +1,16 @@
+import base64
+from datetime import datetime
+from uuid import UUID
+
+
+def encode_cursor(created: datetime, row_id: UUID) -> str:
+    """Opaque keyset cursor for the row a page ended on"""
+    raw = f"{created.isoformat()}|{row_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(cursor: str) -> tuple[datetime, UUID]:
+    """Inverse of encode_cursor; raises ValueError on anything malformed"""
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created, row_id = raw.split('|')
+    return datetime.fromisoformat(created), UUID(row_id)
@@ -0,0 +1,112 @@
+import time
+import threading
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import GridRegion
+from ..config import get_settings
+from .occupancy import cell_ranges, summed_area_table, window_sums
+
+settings = get_settings()
+
+
+class PriceRaster:
+    """
+    Immutable per-cell price-per-pixel and locked mask of the grid.
+
+    Regions are painted in creation order, so a later region overrides an
+    earlier one where they overlap; cells outside every region use the
+    default price.
+    """
+
+    def __init__(self, grid_width: int, grid_height: int, cell_size: int, default_price: float,
+                 regions: list[tuple[int, int, int, int, float, bool]]):
+        self.cell_size = cell_size
+        self.grid_width = grid_width
+        self.grid_height = grid_height
+        rows = -(-grid_height // cell_size)
+        cols = -(-grid_width // cell_size)
+        self.default_price = default_price
+        self.prices = np.full((rows, cols), default_price, dtype=np.float64)
+        self.locked = np.zeros((rows, cols), dtype=bool)
+
+        if regions:
+            rects = np.array([region[:4] for region in regions], dtype=np.int64)
+            ranges = zip(*(bound.tolist() for bound in cell_ranges(rects, cell_size, rows, cols)))
+            for (r0, r1, c0, c1), (*_, price_per_pixel, is_locked) in zip(ranges, regions):
+                self.prices[r0:r1, c0:c1] = price_per_pixel
+                self.locked[r0:r1, c0:c1] = is_locked
+
+        # Summed-area tables: per-pixel prices (exact for rectangles not aligned to cells) and locked cells
+        pixel_prices = np.repeat(np.repeat(self.prices, cell_size, axis=0), cell_size, axis=1)
+        self._price_sat = summed_area_table(pixel_prices[:grid_height, :grid_width])
+        self._locked_sat = summed_area_table(self.locked)
+
+    def quote_many(self, rects: np.ndarray) -> np.ndarray:
+        """Total price of each rectangle of an (N, 4) array, pro rata over every region it covers"""
+        x, y, w, h = rects.T
+        x0 = np.clip(x, 0, self.grid_width)
+        x1 = np.clip(x + w, 0, self.grid_width)
+        y0 = np.clip(y, 0, self.grid_height)
+        y1 = np.clip(y + h, 0, self.grid_height)
+
+        inside = window_sums(self._price_sat, y0, y1, x0, x1)
+        # Anything hanging off the grid is charged at the default price
+        outside_pixels = w * h - (x1 - x0) * (y1 - y0)
+        # Whole pixels at cent prices: rounding only strips float noise
+        return np.round(inside + outside_pixels * self.default_price, 2)
+
+    def locked_many(self, rects: np.ndarray) -> np.ndarray:
+        """Whether each rectangle of an (N, 4) array touches a locked cell"""
+        rows, cols = self.locked.shape
+        return window_sums(self._locked_sat, *cell_ranges(rects, self.cell_size, rows, cols)) > 0
+
+    def quote(self, x_start: int, y_start: int, width: int, height: int) -> float:
+        """Total price of a rectangle, pro rata over every region it covers"""
+        return float(self.quote_many(np.array([[x_start, y_start, width, height]], dtype=np.int64))[0])
+
+    def is_locked(self, x_start: int, y_start: int, width: int, height: int) -> bool:
+        return bool(self.locked_many(np.array([[x_start, y_start, width, height]], dtype=np.int64))[0])
+
+
+class PricingService:
+    """
+    Process-wide holder of the price raster. Rebuilt from grid_regions at
+    startup and lazily once it is older than the refresh interval, so quotes
+    normally need no DB round trip.
+    """
+
+    def __init__(self, refresh_seconds: int):
+        self.refresh_seconds = refresh_seconds
+        self._raster: PriceRaster | None = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    async def rebuild(self, db: AsyncSession) -> PriceRaster:
+        result = await db.execute(select(
+            GridRegion.x_start, GridRegion.y_start, GridRegion.width, GridRegion.height,
+            GridRegion.price_per_pixel, GridRegion.is_locked
+        ).order_by(GridRegion.created_at, GridRegion.id))
+
+        regions = [
+            (x_start, y_start, width, height,
+             float(price) if price is not None else settings.default_price_per_pixel, bool(is_locked))
+            for x_start, y_start, width, height, price, is_locked in result.all()
+        ]
+        raster = PriceRaster(
+            settings.grid_width, settings.grid_height, settings.min_block_size,
+            settings.default_price_per_pixel, regions
+        )
+        with self._lock:
+            self._raster = raster
+            self._built_at = time.monotonic()
+        return raster
+
+    async def get(self, db: AsyncSession) -> PriceRaster:
+        raster = self._raster
+        if raster is None or time.monotonic() - self._built_at > self.refresh_seconds:
+            raster = await self.rebuild(db)
+        return raster
+
+
+pricing_service = PricingService(settings.pricing_refresh_seconds)
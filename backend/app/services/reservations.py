@@ -0,0 +1,193 @@
+import asyncio
+import heapq
+from datetime import timedelta
+from uuid import UUID
+from sqlalchemy import select, update, text, func, not_
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..database import SessionLocal
+from ..models import Block
+from ..config import get_settings
+from .occupancy import holds_area, occupancy_index
+from .grid_events import block_status_changed, block_released
+
+settings = get_settings()
+
+# First key of every reservation advisory lock, so they can't collide with other lock users
+LOCK_NAMESPACE = 0x424C4B  # 'BLK'
+
+_LOCK_SQL = text(
+    "SELECT pg_advisory_xact_lock(:namespace, key) "
+    "FROM (SELECT key FROM unnest(CAST(:keys AS int[])) AS key ORDER BY key) AS ordered"
+)
+
+
+def lock_keys(x_start: int, y_start: int, width: int, height: int) -> list[int]:
+    """Ids of every lock chunk a rectangle touches, in ascending order"""
+    size = settings.reservation_lock_chunk_size
+    cols = -(-settings.grid_width // size)
+    return [
+        row * cols + col
+        for row in range(y_start // size, (y_start + height - 1) // size + 1)
+        for col in range(x_start // size, (x_start + width - 1) // size + 1)
+    ]
+
+
+async def lock_area(db: AsyncSession, x_start: int, y_start: int, width: int, height: int):
+    """
+    Take transaction-scoped advisory locks on the chunks under a rectangle.
+
+    Reservations of disjoint areas take disjoint locks and run in parallel;
+    overlapping ones queue behind each other until the holder commits or
+    rolls back. Locks are always taken in ascending order, so two
+    reservations can never wait on each other in a cycle.
+    """
+    await db.execute(_LOCK_SQL, {
+        'namespace': LOCK_NAMESPACE,
+        'keys': lock_keys(x_start, y_start, width, height),
+    })
+
+
+async def find_overlapping(db: AsyncSession, x_start: int, y_start: int, width: int, height: int) -> list[UUID]:
+    """
+    Ids of blocks holding any part of the rectangle, straight from the DB
+    (GiST range lookup): sold blocks plus drafts still inside their hold.
+    """
+    result = await db.execute(select(Block.id).where(
+        Block.x_range.op('&&')(func.int4range(x_start, x_start + width)),
+        Block.y_range.op('&&')(func.int4range(y_start, y_start + height)),
+        holds_area()
+    ))
+    return list(result.scalars().all())
+
+
+class ReservationHolds:
+    """
+    Expiry scheduler for draft reservations.
+
+    A draft holds its area for hold_minutes after it is created. Holds sit
+    in a min-heap keyed by deadline (event-loop time); one task sleeps until
+    the earliest deadline and then archives every due draft in one UPDATE
+    (status 'expired'), releasing its cells. A periodic sweep catches drafts
+    this worker never scheduled, e.g. those created by a worker that died.
+    Drafts with a payment under way or done are skipped; the sweep expires
+    them only if the checkout lapses without completing.
+    """
+
+    def __init__(self, hold_minutes: int, sweep_seconds: int, batch_size: int):
+        self.hold_seconds = hold_minutes * 60
+        self.sweep_seconds = sweep_seconds
+        self.batch_size = batch_size
+        self._heap: list[tuple[float, UUID]] = []
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+
+    async def start(self, db: AsyncSession):
+        """Schedule every existing draft, with the time its hold has left"""
+        result = await db.execute(select(
+            Block.id,
+            func.extract('epoch', Block.created_at + timedelta(seconds=self.hold_seconds) - func.now())
+        ).where(Block.status == 'draft'))
+
+        now = asyncio.get_running_loop().time()
+        self._heap = [(now + float(remaining), block_id) for block_id, remaining in result.all()]
+        heapq.heapify(self._heap)
+
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    def add(self, block: Block):
+        """Start the hold of a freshly committed draft"""
+        deadline = asyncio.get_running_loop().time() + self.hold_seconds
+        heapq.heappush(self._heap, (deadline, block.id))
+        if self._wakeup is not None and self._heap[0][1] == block.id:
+            self._wakeup.set()
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_sweep = loop.time() + self.sweep_seconds
+        while True:
+            now = loop.time()
+            timeout = next_sweep - now
+            if self._heap:
+                timeout = min(timeout, self._heap[0][0] - now)
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=max(timeout, 0))
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+
+            now = loop.time()
+            due = []
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                due.append(heapq.heappop(self._heap)[1])
+
+            try:
+                if due:
+                    await self._expire(due)
+                if now >= next_sweep:
+                    next_sweep = now + self.sweep_seconds
+                    await self._sweep()
+            except Exception as e:
+                print(f"Reservation expiry error: {e}")
+
+    def _expire_statement(self, condition):
+        # Drafts with a checkout under way or paid keep their hold (see holds_area)
+        return update(Block).where(
+            condition,
+            Block.status == 'draft',
+            not_(holds_area())
+        ).values(status='expired').returning(Block)
+
+    async def _expire(self, block_ids: list[UUID]):
+        async with SessionLocal() as db:
+            result = await db.execute(
+                self._expire_statement(Block.id.in_(block_ids)),
+                execution_options={'synchronize_session': False}
+            )
+            expired = result.scalars().all()
+            await db.commit()
+            await self._release(db, expired)
+
+            # Paid, expired elsewhere or deleted meanwhile: resync whatever this worker still holds
+            leftover = set(block_ids) - {block.id for block in expired}
+            if leftover:
+                result = await db.execute(select(Block).where(Block.id.in_(leftover)))
+                found = result.scalars().all()
+                for block in found:
+                    occupancy_index.apply(block)
+                for block_id in leftover - {block.id for block in found}:
+                    occupancy_index.remove(block_id)
+
+    async def _sweep(self):
+        """Archive stale drafts in batches, whichever worker created them"""
+        async with SessionLocal() as db:
+            while True:
+                stale = select(Block.id).where(
+                    Block.status == 'draft',
+                    not_(holds_area())
+                ).limit(self.batch_size).with_for_update(skip_locked=True)
+                result = await db.execute(
+                    self._expire_statement(Block.id.in_(stale.scalar_subquery())),
+                    execution_options={'synchronize_session': False}
+                )
+                expired = result.scalars().all()
+                await db.commit()
+                await self._release(db, expired)
+                if len(expired) < self.batch_size:
+                    return
+
+    async def _release(self, db: AsyncSession, expired: list[Block]):
+        for block in expired:
+            await block_status_changed(db, block, 'draft')
+            block_released(block)
+
+
+reservation_holds = ReservationHolds(
+    settings.reservation_hold_minutes, settings.reservation_sweep_seconds, settings.reservation_expiry_batch
+)
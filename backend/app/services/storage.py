@@ -1,58 +1,185 @@
 import io
-import uuid
+import hashlib
+from dataclasses import dataclass, field
+from botocore.exceptions import ClientError
 from PIL import Image
-import boto3
 from ..config import get_settings
+from .clients import ClientRegistry, client_registry
+
+try:
+    import pillow_avif  # noqa: F401 - registers the AVIF codec with Pillow
+except ImportError:
+    pass
 
 settings = get_settings()
 
+# Without s3:ListBucket a missing key comes back as 403 AccessDenied instead of 404
+MISSING_OBJECT_ERRORS = {'NoSuchKey', '404', 'AccessDenied', '403'}
 
-class StorageService:
-    def __init__(self):
-        self.s3_client = boto3.client(
-            's3',
-            aws_access_key_id=settings.aws_access_key_id,
-            aws_secret_access_key=settings.aws_secret_access_key,
-            region_name=settings.aws_region
-        )
-        self.bucket_name = settings.s3_bucket_name
+# format -> (file extension, content type, encoder options)
+IMAGE_FORMATS = {
+    'jpeg': ('jpg', 'image/jpeg', {'format': 'JPEG', 'quality': 85, 'optimize': True}),
+    'webp': ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    'avif': ('avif', 'image/avif', {'format': 'AVIF', 'quality': 60}),
+}
 
-    def validate_and_process_image(self, image_bytes: bytes, max_width: int, max_height: int) -> bytes:
-        """Validate image and resize if needed"""
-        try:
-            image = Image.open(io.BytesIO(image_bytes))
 
-            # Convert to RGB if necessary
-            if image.mode in ('RGBA', 'LA', 'P'):
-                background = Image.new('RGB', image.size, (255, 255, 255))
-                if image.mode == 'P':
-                    image = image.convert('RGBA')
-                background.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
-                image = background
+def derivative_formats() -> list[str]:
+    """Formats emitted besides the main JPEG; AVIF only when an encoder is installed"""
+    formats = ['webp']
+    if '.avif' in Image.registered_extensions():
+        formats.append('avif')
+    return formats
 
-            # Resize to exact dimensions
-            if image.size != (max_width, max_height):
-                image = image.resize((max_width, max_height), Image.Resampling.LANCZOS)
 
-            # Save as optimized JPEG
-            output = io.BytesIO()
-            image.save(output, format='JPEG', quality=85, optimize=True)
-            return output.getvalue()
+# Below this grayscale spread (0-255) the dHash bits are just rounding and JPEG noise
+MIN_HASH_STDDEV = 4.0
+# Hashes with fewer set (or unset) bits than this mostly describe flat areas
+MIN_HASH_BITS = 8
 
-        except Exception as e:
-            raise ValueError(f"Invalid image file: {str(e)}")
 
-    def upload_image(self, image_bytes: bytes, block_id: str) -> tuple[str, str]:
+@dataclass(frozen=True)
+class ProcessedImage:
+    data: bytes  # JPEG at the block's exact size
+    perceptual_hash: str | None  # 64-bit dHash as 16 hex chars; None for images too flat to fingerprint
+    # Other representations keyed by variant name: 'webp', 'avif', 'jpeg@2x', 'webp@2x', ...
+    variants: dict[str, bytes] = field(default_factory=dict)
+
+
+def perceptual_hash(image: Image.Image) -> str | None:
+    """
+    Difference hash (dHash): survives re-encoding, resizing and small edits,
+    so near-duplicates land within a few bits of each other.
+    None when the image is too flat for the hash to tell images apart.
+    """
+    small = image.convert('L').resize((9, 8), Image.Resampling.LANCZOS)
+    pixels = list(small.getdata())
+    mean = sum(pixels) / len(pixels)
+    if (sum((p - mean) ** 2 for p in pixels) / len(pixels)) ** 0.5 < MIN_HASH_STDDEV:
+        return None
+    bits = 0
+    for row in range(8):
+        for col in range(8):
+            left = pixels[row * 9 + col]
+            right = pixels[row * 9 + col + 1]
+            bits = (bits << 1) | (1 if left > right else 0)
+    hex_hash = f"{bits:016x}"
+    return hex_hash if is_distinctive_hash(hex_hash) else None
+
+
+def is_distinctive_hash(hex_hash: str | None) -> bool:
+    """Whether a dHash carries enough detail for near-duplicate matching"""
+    if not hex_hash:
+        return False
+    set_bits = int(hex_hash, 16).bit_count()
+    return MIN_HASH_BITS <= set_bits <= 64 - MIN_HASH_BITS
+
+
+# Leading bytes of every accepted upload format
+IMAGE_SIGNATURES = (
+    (b'\xff\xd8\xff', 'JPEG'),
+    (b'\x89PNG\r\n\x1a\n', 'PNG'),
+    (b'GIF87a', 'GIF'),
+    (b'GIF89a', 'GIF'),
+)
+
+
+def sniff_image_format(header: bytes) -> str | None:
+    """Identify an upload from its first bytes, or None if it is not a supported image"""
+    for signature, image_format in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return image_format
+    if header[:4] == b'RIFF' and header[8:12] == b'WEBP':
+        return 'WEBP'
+    return None
+
+
+def _encode(image: Image.Image, image_format: str) -> bytes:
+    output = io.BytesIO()
+    image.save(output, **IMAGE_FORMATS[image_format][2])
+    return output.getvalue()
+
+
+def process_image(image_bytes: bytes, width: int, height: int, max_pixels: int) -> ProcessedImage:
+    """
+    Decode, flatten, resize to exactly width x height and re-encode as JPEG,
+    plus WebP/AVIF versions and a 2x (HiDPI) set when the source is big enough.
+    A plain module-level function so it can run in a worker process.
+    """
+    try:
+        image = Image.open(io.BytesIO(image_bytes))
+
+        # Only the header has been read so far; refuse decompression bombs before decoding
+        if image.width * image.height > max_pixels:
+            raise ValueError(f"image is {image.width}x{image.height}, over the {max_pixels} pixel limit")
+
+        # Let the JPEG decoder downscale by up to 8x instead of decoding at full size
+        if image.format == 'JPEG':
+            image.draft('RGB', (width * 2, height * 2))
+
+        # Convert to RGB if necessary
+        if image.mode in ('RGBA', 'LA', 'P'):
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            if image.mode == 'P':
+                image = image.convert('RGBA')
+            background.paste(image, mask=image.split()[-1] if image.mode in ('RGBA', 'LA') else None)
+            image = background
+
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+
+        # Fingerprint the source, not the block-sized copy: a 10px block has no detail left to hash
+        fingerprint = perceptual_hash(image)
+
+        # A 2x set only when the source has the detail for it; upscaling adds nothing
+        hidpi = None
+        if image.width >= width * 2 and image.height >= height * 2:
+            hidpi = image.resize((width * 2, height * 2), Image.Resampling.LANCZOS)
+
+        # Resize to exact dimensions
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+
+        variants = {image_format: _encode(image, image_format) for image_format in derivative_formats()}
+        if hidpi is not None:
+            for image_format in ['jpeg'] + derivative_formats():
+                variants[f"{image_format}@2x"] = _encode(hidpi, image_format)
+
+        # The main representation stays the optimized JPEG
+        return ProcessedImage(
+            data=_encode(image, 'jpeg'), perceptual_hash=fingerprint, variants=variants
+        )
+
+    except Exception as e:
+        raise ValueError(f"Invalid image file: {str(e)}")
+
+
+class StorageService:
+    def __init__(self, clients: ClientRegistry | None = None):
+        self.s3_client = (clients or client_registry).s3
+        self.bucket_name = settings.s3_bucket_name
+
+    def validate_and_process_image(self, image_bytes: bytes, max_width: int, max_height: int) -> ProcessedImage:
+        """Validate image, resize if needed and fingerprint it"""
+        return process_image(image_bytes, max_width, max_height, settings.max_image_pixels)
+
+    def upload_image(self, image_bytes: bytes, block_id: str, name: str | None = None,
+                     variant: str = 'jpeg') -> tuple[str, str]:
         """
         Upload image to S3 and return (s3_key, public_url)
+        Keys are deterministic: blocks/{block_id}/{name}{@2x}.{ext}, where name
+        defaults to the content hash
         """
-        s3_key = f"blocks/{block_id}/{uuid.uuid4()}.jpg"
+        image_format, _, density = variant.partition('@')
+        extension, content_type, _ = IMAGE_FORMATS[image_format]
+        name = name or hashlib.sha256(image_bytes).hexdigest()[:16]
+        s3_key = f"blocks/{block_id}/{name}{'@' + density if density else ''}.{extension}"
 
         self.s3_client.put_object(
             Bucket=self.bucket_name,
             Key=s3_key,
             Body=image_bytes,
-            ContentType='image/jpeg',
+            ContentType=content_type,
             CacheControl='public, max-age=31536000',
             ACL='public-read'
         )
@@ -61,6 +188,47 @@ class StorageService:
 
         return s3_key, public_url
 
+    def upload_processed_image(self, processed: ProcessedImage, block_id: str) -> tuple[str, str, dict[str, str]]:
+        """
+        Upload the main JPEG and every derivative under one name
+        Returns (s3_key, public_url, {variant: public_url}) for the main JPEG
+        """
+        name = hashlib.sha256(processed.data).hexdigest()[:16]
+        s3_key, public_url = self.upload_image(processed.data, block_id, name)
+
+        variant_urls = {'jpeg': public_url}
+        for variant, data in processed.variants.items():
+            _, variant_urls[variant] = self.upload_image(data, block_id, name, variant)
+
+        return s3_key, public_url, variant_urls
+
+    def upload_object(self, s3_key: str, body: bytes, content_type: str, cache_control: str = 'no-cache'):
+        """Upload an arbitrary object (tiles, manifests) under a fixed key"""
+        self.s3_client.put_object(
+            Bucket=self.bucket_name,
+            Key=s3_key,
+            Body=body,
+            ContentType=content_type,
+            CacheControl=cache_control
+        )
+
+    def download_object(self, s3_key: str) -> bytes | None:
+        """Download an object from S3, or None if it does not exist (or is not readable)"""
+        try:
+            response = self.s3_client.get_object(Bucket=self.bucket_name, Key=s3_key)
+            return response['Body'].read()
+        except ClientError as e:
+            if e.response.get('Error', {}).get('Code') in MISSING_OBJECT_ERRORS:
+                return None
+            raise
+
+    def key_from_url(self, public_url: str) -> str:
+        """Recover the S3 key from a public URL returned by upload_image"""
+        prefix = f"https://{self.bucket_name}.s3.{settings.aws_region}.amazonaws.com/"
+        if not public_url.startswith(prefix):
+            raise ValueError(f"Not a {self.bucket_name} URL: {public_url}")
+        return public_url[len(prefix):]
+
     def delete_image(self, s3_key: str):
         """Delete image from S3"""
         try:
@@ -70,3 +238,8 @@ class StorageService:
             )
         except Exception as e:
             print(f"Error deleting image: {e}")
+
+    def delete_variants(self, variant_urls: dict[str, str]):
+        """Delete every stored representation of an image"""
+        for public_url in variant_urls.values():
+            self.delete_image(self.key_from_url(public_url))
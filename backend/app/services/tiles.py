@@ -0,0 +1,207 @@
+import hashlib
+import io
+import json
+import math
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Block, BlockImage
+from ..config import get_settings
+from .storage import StorageService
+from .block_images import image_version
+
+settings = get_settings()
+
+MOSAIC_KEY = 'tiles/mosaic.png'
+MANIFEST_KEY = 'tiles/manifest.json'
+# Tiles are overwritten in place under fixed keys, so S3/CDN copies must expire
+TILE_CACHE_CONTROL = 'public, max-age=60'
+
+
+class TileService:
+    """
+    Composites approved block images into one grid mosaic and cuts it into a
+    tile pyramid. At max_zoom one tile pixel is one grid pixel; each lower
+    zoom halves the resolution, down to a single tile at zoom 0.
+    """
+
+    def __init__(self, grid_width: int, grid_height: int, tile_size: int):
+        self.tile_size = tile_size
+        self.max_zoom = max(0, math.ceil(math.log2(max(grid_width, grid_height) / tile_size)))
+        self.world_size = tile_size * 2 ** self.max_zoom
+
+        self._hashes: dict[str, str] = {}
+        self._cache: dict[str, bytes] = {}
+        self._mosaic: Image.Image | None = None
+        self._storage: StorageService | None = None
+        self._lock = threading.Lock()
+        # One worker keeps renders ordered and off the event loop
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='tiles')
+
+    @property
+    def storage(self) -> StorageService:
+        if self._storage is None:
+            self._storage = StorageService()
+        return self._storage
+
+    async def start(self, db: AsyncSession):
+        """
+        Load the published pyramid, or render it from scratch if there is none
+        Both happen on the tile worker, so startup does not wait on (or fail with) S3
+        """
+        result = await db.execute(select(
+            Block.x_start, Block.y_start, Block.width, Block.height, BlockImage.image_url
+        ).join(
+            BlockImage, BlockImage.block_id == Block.id
+        ).where(
+            Block.status == 'approved'
+        ).order_by(Block.id, *image_version()))
+
+        # Later image versions overwrite earlier ones
+        latest = {}
+        for x_start, y_start, width, height, image_url in result.all():
+            latest[(x_start, y_start, width, height)] = image_url
+
+        self._executor.submit(self._run, self._load_or_rebuild, list(latest.items()))
+
+    def stop(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def schedule_block(self, block: Block, image_url: str | None):
+        """Re-render the tiles under a block whose approved state changed"""
+        rect = (block.x_start, block.y_start, block.width, block.height)
+        if block.status != 'approved':
+            image_url = None
+        self._executor.submit(self._run, self._refresh_block, rect, image_url)
+
+    def manifest(self) -> dict:
+        return {
+            'tile_size': self.tile_size,
+            'max_zoom': self.max_zoom,
+            'tiles': dict(self._hashes),
+        }
+
+    def get_tile(self, z: int, x: int, y: int) -> tuple[bytes, str] | None:
+        """Return (png_bytes, version) for a tile, or None if it does not exist"""
+        key = f"{z}/{x}/{y}"
+        version = self._hashes.get(key)
+        if version is None:
+            return None
+
+        content = self._cache.get(key)
+        if content is None:
+            content = self.storage.download_object(f"tiles/{key}.png")
+            if content is None:
+                return None
+            self._cache[key] = content
+        return content, version
+
+    def tiles_for_rect(self, x_start: int, y_start: int, width: int, height: int):
+        """Yield (z, x, y) of every tile intersecting a grid rectangle"""
+        for z in range(self.max_zoom + 1):
+            span = self.tile_size * 2 ** (self.max_zoom - z)
+            for ty in range(y_start // span, (y_start + height - 1) // span + 1):
+                for tx in range(x_start // span, (x_start + width - 1) // span + 1):
+                    yield z, tx, ty
+
+    def _all_tiles(self):
+        for z in range(self.max_zoom + 1):
+            for ty in range(2 ** z):
+                for tx in range(2 ** z):
+                    yield z, tx, ty
+
+    def _run(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            print(f"Tile rendering error: {e}")
+
+    def _load_manifest(self) -> bool:
+        manifest = self.storage.download_object(MANIFEST_KEY)
+        if manifest:
+            data = json.loads(manifest)
+            if data.get('tile_size') == self.tile_size and data.get('max_zoom') == self.max_zoom:
+                with self._lock:
+                    self._hashes = data['tiles']
+                return True
+        return False
+
+    def _load_or_rebuild(self, blocks: list[tuple[tuple[int, int, int, int], str]]):
+        try:
+            if self._load_manifest():
+                return
+        except Exception as e:
+            print(f"Tile manifest error: {e}")
+        self._rebuild(blocks)
+
+    def _load_mosaic(self) -> Image.Image:
+        if self._mosaic is None:
+            data = self.storage.download_object(MOSAIC_KEY)
+            if data:
+                self._mosaic = Image.open(io.BytesIO(data)).convert('RGBA')
+            else:
+                self._mosaic = Image.new('RGBA', (self.world_size, self.world_size))
+        return self._mosaic
+
+    def _paste_block(self, mosaic: Image.Image, x_start: int, y_start: int, width: int, height: int, image_url: str):
+        data = self.storage.download_object(self.storage.key_from_url(image_url))
+        if data is None:
+            return
+        image = Image.open(io.BytesIO(data)).convert('RGBA')
+        if image.size != (width, height):
+            image = image.resize((width, height), Image.Resampling.LANCZOS)
+        mosaic.paste(image, (x_start, y_start))
+
+    def _rebuild(self, blocks: list[tuple[tuple[int, int, int, int], str]]):
+        mosaic = Image.new('RGBA', (self.world_size, self.world_size))
+        for (x_start, y_start, width, height), image_url in blocks:
+            self._paste_block(mosaic, x_start, y_start, width, height, image_url)
+
+        self._mosaic = mosaic
+        self._publish(list(self._all_tiles()))
+
+    def _refresh_block(self, rect: tuple[int, int, int, int], image_url: str | None):
+        x_start, y_start, width, height = rect
+
+        mosaic = self._load_mosaic()
+        mosaic.paste((0, 0, 0, 0), (x_start, y_start, x_start + width, y_start + height))
+        if image_url:
+            self._paste_block(mosaic, x_start, y_start, width, height, image_url)
+
+        self._publish(list(self.tiles_for_rect(x_start, y_start, width, height)))
+
+    def _render_tile(self, mosaic: Image.Image, z: int, x: int, y: int) -> bytes:
+        span = self.tile_size * 2 ** (self.max_zoom - z)
+        tile = mosaic.crop((x * span, y * span, (x + 1) * span, (y + 1) * span))
+        if span != self.tile_size:
+            tile = tile.resize((self.tile_size, self.tile_size), Image.Resampling.LANCZOS)
+
+        output = io.BytesIO()
+        tile.save(output, format='PNG')
+        return output.getvalue()
+
+    def _publish(self, tiles: list[tuple[int, int, int]]):
+        mosaic = self._mosaic
+        rendered = {}
+        for z, x, y in tiles:
+            content = self._render_tile(mosaic, z, x, y)
+            key = f"{z}/{x}/{y}"
+            self.storage.upload_object(f"tiles/{key}.png", content, 'image/png', TILE_CACHE_CONTROL)
+            rendered[key] = (content, hashlib.sha256(content).hexdigest()[:16])
+
+        output = io.BytesIO()
+        mosaic.save(output, format='PNG')
+        self.storage.upload_object(MOSAIC_KEY, output.getvalue(), 'image/png')
+
+        with self._lock:
+            for key, (content, version) in rendered.items():
+                self._cache[key] = content
+                self._hashes[key] = version
+            manifest = json.dumps(self.manifest()).encode()
+
+        self.storage.upload_object(MANIFEST_KEY, manifest, 'application/json')
+
+
+tile_service = TileService(settings.grid_width, settings.grid_height, settings.tile_size)
@@ -0,0 +1,123 @@
+import asyncio
+import time
+from contextlib import contextmanager
+from typing import BinaryIO
+from concurrent.futures.process import BrokenProcessPool
+from sqlalchemy.ext.asyncio import AsyncSession
+from ..models import Block, BlockImage
+from ..config import get_settings
+from .storage import StorageService, sniff_image_format
+from .moderation import ModerationService
+from .moderation_jobs import ModerationJob, moderation_pool
+from .image_processing import image_pool
+
+settings = get_settings()
+
+
+class UploadRejected(Exception):
+    """An upload refused by one of the pipeline stages"""
+
+    def __init__(self, status_code: int, detail: str):
+        super().__init__(detail)
+        self.status_code = status_code
+        self.detail = detail
+
+
+class UploadPipeline:
+    """
+    Block image upload as explicit stages, cheapest rejections first:
+
+        validate -> domain ban -> process -> hash -> image bans -> store -> record -> moderate
+
+    Nothing touches S3 until every ban check has passed, and each stage's
+    output (processed image, hash) is handed on instead of recomputed.
+    Per-stage wall times end up in `timings` (milliseconds).
+    """
+
+    def __init__(self, db: AsyncSession, storage: StorageService | None = None,
+                 moderation: ModerationService | None = None):
+        self.db = db
+        self.storage = storage or StorageService()
+        self.moderation = moderation or ModerationService(db)
+        self.timings: dict[str, float] = {}
+
+    @contextmanager
+    def _stage(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    def server_timing(self) -> str:
+        """Timings as a Server-Timing header value"""
+        return ', '.join(f"{name};dur={duration:.1f}" for name, duration in self.timings.items())
+
+    async def run(self, block: Block, source: BinaryIO, size: int | None, link_url: str,
+                  hover_title: str | None = None, hover_description: str | None = None,
+                  hover_cta: str | None = None) -> ModerationJob:
+        with self._stage('validate'):
+            if block.status == 'expired':
+                raise UploadRejected(410, "Reservation expired, reserve the area again")
+            # The body is already spooled to a temporary file; look at the header before anything else
+            if sniff_image_format(source.read(16)) is None:
+                raise UploadRejected(400, "Unsupported image format")
+            if size is not None and size > settings.max_image_size_mb * 1024 * 1024:
+                raise UploadRejected(413, f"Image too large (max {settings.max_image_size_mb}MB)")
+            source.seek(0)
+
+        with self._stage('domain_ban'):
+            if await self.moderation.check_banned_domain(link_url):
+                raise UploadRejected(400, "This domain has been banned")
+
+        with self._stage('process'):
+            try:
+                processed = await image_pool.process(source, block.width, block.height)
+            except ValueError as e:
+                raise UploadRejected(400, str(e))
+            except BrokenProcessPool:
+                raise UploadRejected(503, "Image processing failed, please try again")
+
+        with self._stage('hash'):
+            image_hash = self.moderation.calculate_image_hash(processed.data)
+
+        with self._stage('image_ban'):
+            if await self.moderation.check_banned_hash(image_hash):
+                raise UploadRejected(400, "This image has been banned")
+            # Near-duplicates of a banned image
+            if await self.moderation.check_banned_perceptual_hash(processed.perceptual_hash):
+                raise UploadRejected(400, "This image has been banned")
+
+        with self._stage('store'):
+            s3_key, image_url, image_variants = await asyncio.to_thread(
+                self.storage.upload_processed_image, processed, str(block.id)
+            )
+
+        with self._stage('record'):
+            block_image = BlockImage(
+                block_id=block.id,
+                image_url=image_url,
+                image_variants=image_variants,
+                image_hash=image_hash,
+                perceptual_hash=processed.perceptual_hash,
+                link_url=link_url,
+                hover_title=hover_title,
+                hover_description=hover_description,
+                hover_cta=hover_cta
+            )
+            try:
+                self.db.add(block_image)
+                await self.db.commit()
+                await self.db.refresh(block_image)
+            except Exception:
+                # Don't leave orphaned objects behind
+                await asyncio.to_thread(self.storage.delete_variants, image_variants)
+                raise
+
+        with self._stage('moderate'):
+            # The worker pool updates the block status when done
+            job = moderation_pool.submit(ModerationJob(
+                block.id, block_image.id, processed.data, s3_key, link_url, image_hash
+            ))
+
+        return job
@@ -0,0 +1,106 @@
+"""
+Moderation-dashboard request latency against a running API, to compare
+admin principal caching on and off.
+
+Logs in once, then replays the dashboard's authenticated calls
+(/admin/me and the first moderation queue page). Run the server once with
+the cache disabled and once with the default, and compare:
+
+    ADMIN_CACHE_TTL_SECONDS=0 uvicorn app.main:app   # without the cache
+    uvicorn app.main:app                             # with the cache
+
+    python benchmarks/bench_admin_auth.py --email admin@example.com --password ... --requests 2000
+
+--logins N additionally fires N concurrent logins while /health is being
+polled, showing whether bcrypt still stalls the event loop.
+"""
+import argparse
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+DASHBOARD_PATHS = {
+    'me': '/admin/me',
+    'pending': '/moderation/pending?limit=20',
+}
+
+
+def report(name: str, latencies: list[float], elapsed: float, errors: int):
+    latencies = sorted(latencies)
+    print(
+        f"{name:<12} {len(latencies) / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms  "
+        f"errors {errors}"
+    )
+
+
+def run_dashboard(session: requests.Session, base_url: str, token: str, name: str, concurrency: int, total: int):
+    url = base_url + DASHBOARD_PATHS[name]
+    headers = {'Authorization': f'Bearer {token}'}
+
+    def call(_):
+        start = time.perf_counter()
+        response = session.get(url, headers=headers)
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+    report(name, [latency for latency, _ in results], elapsed, sum(1 for _, status in results if status >= 400))
+
+
+def run_logins(session: requests.Session, base_url: str, email: str, password: str, logins: int):
+    """Concurrent logins while a single client polls /health; loop stalls show up in its p99"""
+    done = threading.Event()
+    health = []
+
+    def poll():
+        while not done.is_set():
+            start = time.perf_counter()
+            session.get(base_url + '/health')
+            health.append(time.perf_counter() - start)
+
+    poller = threading.Thread(target=poll)
+    poller.start()
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=logins) as executor:
+        list(executor.map(
+            lambda _: session.post(base_url + '/admin/login', json={'email': email, 'password': password}),
+            range(logins)
+        ))
+    elapsed = time.perf_counter() - started
+    done.set()
+    poller.join()
+    report('health', health, elapsed, 0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--email', required=True)
+    parser.add_argument('--password', required=True)
+    parser.add_argument('--concurrency', type=int, default=20)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--logins', type=int, default=0)
+    args = parser.parse_args()
+
+    base_url = args.url.rstrip('/')
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=max(args.concurrency, args.logins, 1) + 1))
+
+    response = session.post(base_url + '/admin/login', json={'email': args.email, 'password': args.password})
+    response.raise_for_status()
+    token = response.json()['access_token']
+
+    for name in DASHBOARD_PATHS:
+        run_dashboard(session, base_url, token, name, args.concurrency, args.requests)
+    if args.logins:
+        run_logins(session, base_url, args.email, args.password, args.logins)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,61 @@
+"""
+Concurrent-request throughput against a running API.
+
+Run it against the server before and after a change and compare req/s:
+
+    python benchmarks/bench_concurrency.py --url http://localhost:8000 --concurrency 50 --requests 2000
+"""
+import argparse
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+# DB-backed endpoints; the check-availability body prices a 10x10 block
+ENDPOINTS = {
+    'grid': ('GET', '/blocks/grid', None),
+    'check-availability': ('POST', '/blocks/check-availability', {'x_start': 0, 'y_start': 0, 'width': 10, 'height': 10}),
+    'health': ('GET', '/health', None),
+}
+
+
+def run(base_url: str, endpoint: str, concurrency: int, total: int):
+    method, path, body = ENDPOINTS[endpoint]
+    url = base_url.rstrip('/') + path
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=concurrency))
+
+    def call(_):
+        start = time.perf_counter()
+        response = session.request(method, url, json=body)
+        return time.perf_counter() - start, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(call, range(total)))
+    elapsed = time.perf_counter() - started
+
+    latencies = sorted(latency for latency, _ in results)
+    errors = sum(1 for _, status in results if status >= 400)
+    print(
+        f"{endpoint:<20} {total / elapsed:8.1f} req/s  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p99 {latencies[int(len(latencies) * 0.99) - 1] * 1000:7.1f} ms  "
+        f"errors {errors}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--concurrency', type=int, default=50)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--endpoint', choices=sorted(ENDPOINTS), action='append')
+    args = parser.parse_args()
+
+    for endpoint in args.endpoint or ['grid', 'check-availability']:
+        run(args.url, endpoint, args.concurrency, args.requests)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+"""
+Serialization time and bytes on the wire for the /blocks/grid payload at
+1k, 10k and 100k blocks, without needing a database.
+
+Compares FastAPI's response_model path (Pydantic validation of
+list[GridBlockResponse], jsonable_encoder, stdlib json) with orjson on
+the ready-made dicts the grid snapshot holds, then shows the payload
+size raw, gzipped and brotli-compressed (when brotli is installed):
+
+    python benchmarks/bench_grid_serialization.py --sizes 1000 10000 100000
+
+With --url it also fetches /blocks/grid from a running API under each
+Accept-Encoding and prints the bytes actually transferred.
+"""
+import argparse
+import gzip
+import json
+import random
+import sys
+import time
+import uuid
+from pathlib import Path
+
+import orjson
+import requests
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+from app.schemas import GridBlockResponse  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def grid_entries(count: int, seed: int) -> list[dict]:
+    """Entries shaped like grid_snapshot.serialize_grid_block output"""
+    rng = random.Random(seed)
+    entries = []
+    for i in range(count):
+        block_id = uuid.UUID(int=rng.getrandbits(128))
+        base = f"https://cdn.example.com/blocks/{block_id}/image"
+        entries.append({
+            'id': str(block_id),
+            'x_start': 10 * (i % 100),
+            'y_start': 10 * (i // 100),
+            'width': 10 * rng.randint(1, 5),
+            'height': 10 * rng.randint(1, 5),
+            'image_url': f"{base}.jpg",
+            'image_variants': {'webp': f"{base}.webp", 'webp@2x': f"{base}@2x.webp"},
+            'link_url': f"https://shop{i}.example.com/",
+            'hover_title': f"Shop {i}",
+            'hover_description': "Handmade goods, shipped worldwide" if i % 3 else None,
+            'hover_cta': "Visit" if i % 2 else None,
+        })
+    return entries
+
+
+def timed(fn, repeat: int) -> tuple[float, bytes]:
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def run(count: int, repeat: int):
+    entries = grid_entries(count, seed=count)
+    adapter = TypeAdapter(list[GridBlockResponse])
+
+    def default_path():
+        validated = adapter.validate_python(entries)
+        return json.dumps(jsonable_encoder(validated), ensure_ascii=False, separators=(',', ':')).encode()
+
+    default_time, default_body = timed(default_path, repeat)
+    orjson_time, body = timed(lambda: orjson.dumps(entries), repeat)
+    gzip_time, gzip_body = timed(lambda: gzip.compress(body, compresslevel=6, mtime=0), repeat)
+
+    print(f"{count:>7} blocks")
+    print(f"  serialize  response_model + json  {default_time * 1000:9.1f} ms  {len(default_body):>11,} B")
+    print(f"  serialize  orjson                 {orjson_time * 1000:9.1f} ms  {len(body):>11,} B")
+    print(f"  compress   gzip -6                {gzip_time * 1000:9.1f} ms  {len(gzip_body):>11,} B")
+    if brotli is not None:
+        for quality in (4, 9):
+            br_time, br_body = timed(lambda: brotli.compress(body, quality=quality), repeat)
+            print(f"  compress   brotli q{quality:<2}             {br_time * 1000:9.1f} ms  {len(br_body):>11,} B")
+
+
+def fetch(base_url: str):
+    url = base_url.rstrip('/') + '/blocks/grid'
+    for encoding in ('identity', 'gzip', 'br'):
+        response = requests.get(url, headers={'Accept-Encoding': encoding}, stream=True)
+        wire = len(response.raw.read(decode_content=False))
+        served = response.headers.get('Content-Encoding', 'identity')
+        print(f"  GET /blocks/grid  Accept-Encoding: {encoding:<8} -> {served:<8} {wire:>11,} B on the wire")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 10000, 100000])
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--url', help='also measure a running API')
+    args = parser.parse_args()
+
+    for count in args.sizes:
+        run(count, args.repeat)
+    if args.url:
+        fetch(args.url)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""
+Upload latency with a fresh boto3 client per upload (the old StorageService
+behaviour) versus the shared client registry.
+
+Needs the usual AWS/S3 settings in the environment or .env; objects are
+written under benchmarks/ in the configured bucket and deleted afterwards.
+
+    python benchmarks/bench_upload_clients.py --uploads 50 --size-kb 40
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+import boto3
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from app.config import get_settings  # noqa: E402
+from app.services.clients import client_registry  # noqa: E402
+
+settings = get_settings()
+
+
+def per_request_client():
+    return boto3.client(
+        's3',
+        aws_access_key_id=settings.aws_access_key_id,
+        aws_secret_access_key=settings.aws_secret_access_key,
+        region_name=settings.aws_region
+    )
+
+
+def run(label: str, make_client, uploads: int, body: bytes):
+    latencies = []
+    keys = []
+    for i in range(uploads):
+        key = f"benchmarks/{label}/{i}.bin"
+        start = time.perf_counter()
+        make_client().put_object(Bucket=settings.s3_bucket_name, Key=key, Body=body)
+        latencies.append(time.perf_counter() - start)
+        keys.append(key)
+
+    cleanup = client_registry.s3
+    for key in keys:
+        cleanup.delete_object(Bucket=settings.s3_bucket_name, Key=key)
+
+    latencies.sort()
+    print(
+        f"{label:<12} mean {statistics.mean(latencies) * 1000:7.1f} ms  "
+        f"p50 {statistics.median(latencies) * 1000:7.1f} ms  "
+        f"p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:7.1f} ms"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--uploads', type=int, default=50)
+    parser.add_argument('--size-kb', type=int, default=40)
+    args = parser.parse_args()
+
+    body = os.urandom(args.size_kb * 1024)
+    client_registry.start()
+    try:
+        run('per-request', per_request_client, args.uploads, body)
+        run('shared', lambda: client_registry.s3, args.uploads, body)
+    finally:
+        client_registry.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+"""
+Fire hundreds of simultaneous reservations at a running API and check that
+no two successful ones overlap.
+
+Half the requests pile onto a few contested rectangles, the rest go to
+disjoint ones, so the run shows both serialization of overlapping buyers
+and parallelism of unrelated ones. Use an empty grid (or a fresh --origin)
+because the created drafts hold their area until they expire.
+
+    python benchmarks/reserve_race.py --url http://localhost:8000 --requests 400 --concurrency 200
+"""
+import argparse
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+
+def rectangles(count: int, origin: int, seed: int) -> list[tuple[int, int, int, int]]:
+    rng = random.Random(seed)
+    contested = [(origin + 100 * i, origin, 30, 30) for i in range(4)]
+    rects = []
+    for i in range(count):
+        if i % 2 == 0:
+            # Shift a contested rectangle by a cell or two so overlaps are partial too
+            x, y, w, h = rng.choice(contested)
+            rects.append((x + 10 * rng.randint(0, 2), y + 10 * rng.randint(0, 2), w, h))
+        else:
+            # Disjoint 10x10 cells further down the grid
+            cell = i // 2
+            rects.append((10 * (cell % 80), origin + 100 + 10 * (cell // 80), 10, 10))
+    return rects
+
+
+def overlaps(a, b) -> bool:
+    return a[0] < b[0] + b[2] and b[0] < a[0] + a[2] and a[1] < b[1] + b[3] and b[1] < a[1] + a[3]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', default='http://localhost:8000')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--concurrency', type=int, default=200)
+    parser.add_argument('--origin', type=int, default=0, help='y offset of the area used (multiple of 10)')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    rects = rectangles(args.requests, args.origin, args.seed)
+    session = requests.Session()
+    session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=args.concurrency))
+    start_gate = threading.Barrier(min(args.concurrency, len(rects)))
+
+    def reserve(rect):
+        try:
+            start_gate.wait(timeout=10)
+        except threading.BrokenBarrierError:
+            pass
+        x, y, w, h = rect
+        response = session.post(f"{args.url.rstrip('/')}/blocks/reserve", json={
+            'x_start': x, 'y_start': y, 'width': w, 'height': h,
+            'link_url': 'https://example.com', 'buyer_email': 'race@example.com',
+        })
+        return rect, response.status_code
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        results = list(executor.map(reserve, rects))
+    elapsed = time.perf_counter() - started
+
+    won = [rect for rect, status in results if status == 200]
+    lost = sum(1 for _, status in results if status == 400)
+    errors = [status for _, status in results if status not in (200, 400)]
+    double_sold = [(a, b) for i, a in enumerate(won) for b in won[i + 1:] if overlaps(a, b)]
+
+    print(f"{len(results)} reservations in {elapsed:.2f}s: {len(won)} won, {lost} refused, {len(errors)} errors")
+    if double_sold:
+        print(f"FAIL: {len(double_sold)} overlapping reservations, e.g. {double_sold[0]}")
+        raise SystemExit(1)
+    print("OK: no overlapping reservations")
+
+
+if __name__ == '__main__':
+    main()
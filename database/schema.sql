@@ -26,17 +26,21 @@ CREATE TABLE blocks (
     width INTEGER NOT NULL CHECK (width >= 10 AND width % 10 = 0),
     height INTEGER NOT NULL CHECK (height >= 10 AND height % 10 = 0),
     pixel_count INTEGER GENERATED ALWAYS AS (width * height) STORED,
+    x_range INT4RANGE GENERATED ALWAYS AS (int4range(x_start, x_start + width)) STORED, -- [x_start, x_end)
+    y_range INT4RANGE GENERATED ALWAYS AS (int4range(y_start, y_start + height)) STORED, -- [y_start, y_end)
     price_paid DECIMAL(10, 2) NOT NULL,
     buyer_email VARCHAR(255) NOT NULL,
     edit_token VARCHAR(255) UNIQUE NOT NULL,
-    status VARCHAR(50) NOT NULL DEFAULT 'draft' CHECK (status IN ('draft', 'pending_review', 'approved', 'rejected', 'removed_after_publish')),
+    status VARCHAR(50) NOT NULL DEFAULT 'draft' CHECK (status IN ('draft', 'pending_review', 'approved', 'rejected', 'removed_after_publish', 'expired')),
     rejection_reason TEXT,
     purchased_at TIMESTAMP DEFAULT NOW(),
     approved_at TIMESTAMP,
     expires_at TIMESTAMP, -- NULL = permanent, otherwise time-based ownership
     created_at TIMESTAMP DEFAULT NOW(),
     updated_at TIMESTAMP DEFAULT NOW(),
-    CONSTRAINT unique_grid_position UNIQUE (x_start, y_start)
+    -- Sold area may never overlap, even when two purchases race (backed by a partial GiST index)
+    CONSTRAINT no_overlapping_active_blocks EXCLUDE USING gist (x_range WITH &&, y_range WITH &&)
+        WHERE (status IN ('pending_review', 'approved'))
 );
 
 -- Block images
@@ -44,7 +48,9 @@ CREATE TABLE block_images (
     id UUID PRIMARY KEY DEFAULT uuid_generate_v4(),
     block_id UUID NOT NULL REFERENCES blocks(id) ON DELETE CASCADE,
     image_url VARCHAR(500) NOT NULL, -- S3 URL
+    image_variants JSONB, -- {variant: URL}, e.g. jpeg, webp, avif, jpeg@2x, webp@2x
     image_hash VARCHAR(64) NOT NULL, -- SHA256 for duplicate detection
+    perceptual_hash VARCHAR(16), -- 64-bit dHash (hex) for near-duplicate detection
     link_url VARCHAR(500) NOT NULL,
     hover_title VARCHAR(100),
     hover_description VARCHAR(255),
@@ -122,11 +128,20 @@ CREATE TABLE grid_regions (
 -- Indexes for performance
 CREATE INDEX idx_blocks_status ON blocks(status);
 CREATE INDEX idx_blocks_buyer_email ON blocks(buyer_email);
-CREATE INDEX idx_blocks_position ON blocks(x_start, y_start);
+CREATE INDEX idx_blocks_area ON blocks USING gist (x_range, y_range); -- overlap lookups in any status
+CREATE INDEX idx_blocks_pending_queue ON blocks(purchased_at DESC, id DESC) WHERE status = 'pending_review'; -- moderation queue keyset
 CREATE INDEX idx_moderation_flagged ON moderation_checks(flagged);
+CREATE INDEX idx_moderation_checks_image ON moderation_checks(block_image_id, check_type);
 CREATE INDEX idx_payments_stripe_id ON payments(stripe_payment_id);
-CREATE INDEX idx_admin_actions_timestamp ON admin_actions(created_at);
+CREATE INDEX idx_payments_block ON payments(block_id, status); -- drafts being paid for keep their hold
+-- Audit log keyset order (created_at, id), alone and behind each equality filter
+CREATE INDEX idx_admin_actions_timestamp ON admin_actions(created_at DESC, id DESC);
+CREATE INDEX idx_admin_actions_type ON admin_actions(action_type, created_at DESC, id DESC);
+CREATE INDEX idx_admin_actions_admin ON admin_actions(admin_id, created_at DESC, id DESC);
+CREATE INDEX idx_admin_actions_target ON admin_actions(target_type, target_id, created_at DESC, id DESC);
 CREATE INDEX idx_block_images_hash ON block_images(image_hash);
+CREATE INDEX idx_block_images_perceptual_hash ON block_images(perceptual_hash);
+CREATE INDEX idx_block_images_latest ON block_images(block_id, moderation_version DESC, created_at DESC);
 
 -- Seed initial admin (change password immediately)
 -- Password: admin123 (hashed with bcrypt, cost 12)
@@ -22,7 +22,7 @@ export default function AdminDashboard() {
         moderationAPI.getPendingBlocks(),
       ])
       setAdmin(adminData)
-      setPendingBlocks(pending)
+      setPendingBlocks(pending.items)
     } catch (error) {
       console.error('Failed to load data:', error)
       router.push('/admin/login')
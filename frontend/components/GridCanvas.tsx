@@ -9,6 +9,7 @@ interface Block {
   width: number
   height: number
   image_url?: string
+  image_variants?: Record<string, string>
   link_url?: string
   hover_title?: string
   hover_description?: string
@@ -24,6 +25,14 @@ interface GridCanvasProps {
 const GRID_SIZE = 1000
 const MIN_BLOCK_SIZE = 10
 
+// Prefer WebP, and the 2x set on HiDPI screens, falling back to the main JPEG
+function blockImageUrl(block: Block): string | undefined {
+  const variants = block.image_variants
+  if (!variants) return block.image_url
+  const density = typeof window !== 'undefined' && window.devicePixelRatio > 1 ? '@2x' : ''
+  return variants[`webp${density}`] ?? variants[`jpeg${density}`] ?? variants.webp ?? block.image_url
+}
+
 export default function GridCanvas({ blocks, onSelect, selectionMode = false }: GridCanvasProps) {
   const canvasRef = useRef<HTMLCanvasElement>(null)
   const containerRef = useRef<HTMLDivElement>(null)
@@ -43,15 +52,16 @@ export default function GridCanvas({ blocks, onSelect, selectionMode = false }:
     const cache = imageCache.current
 
     blocks.forEach((block) => {
-      if (block.image_url && !cache.has(block.image_url)) {
+      const url = blockImageUrl(block)
+      if (url && !cache.has(url)) {
         const img = new Image()
         img.crossOrigin = 'anonymous'
         img.onload = () => {
           loadedCount++
           setImagesLoaded(loadedCount)
         }
-        img.src = block.image_url
-        cache.set(block.image_url, img)
+        img.src = url
+        cache.set(url, img)
       }
     })
   }, [blocks])
@@ -165,8 +175,9 @@ export default function GridCanvas({ blocks, onSelect, selectionMode = false }:
 
     // Draw blocks with images
     blocks.forEach((block) => {
-      if (block.image_url) {
-        const cachedImg = imageCache.current.get(block.image_url)
+      const url = blockImageUrl(block)
+      if (url) {
+        const cachedImg = imageCache.current.get(url)
         if (cachedImg && cachedImg.complete) {
           ctx.drawImage(cachedImg, block.x_start, block.y_start, block.width, block.height)
 
@@ -32,6 +32,32 @@ export const gridAPI = {
     return response.data
   },
 
+  checkAvailabilityBatch: async (rectangles: {
+    x_start: number
+    y_start: number
+    width: number
+    height: number
+  }[]) => {
+    const response = await api.post('/blocks/check-availability/batch', { rectangles })
+    return response.data
+  },
+
+  findFreeSpace: async (params: {
+    width: number
+    height: number
+    near_x?: number
+    near_y?: number
+    limit?: number
+  }) => {
+    const response = await api.get('/blocks/free-space', { params })
+    return response.data
+  },
+
+  getLargestFreeSpace: async () => {
+    const response = await api.get('/blocks/free-space/largest')
+    return response.data
+  },
+
   reserveBlock: async (data: {
     x_start: number
     y_start: number
@@ -71,6 +97,13 @@ export const gridAPI = {
     return response.data
   },
 
+  getModerationJob: async (blockId: string, jobId: string, wait = 0) => {
+    const response = await api.get(`/blocks/${blockId}/moderation/${jobId}`, {
+      params: { wait },
+    })
+    return response.data
+  },
+
   getGridState: async () => {
     const response = await api.get('/blocks/grid')
     return response.data
@@ -112,10 +145,16 @@ export const adminAPI = {
 }
 
 export const moderationAPI = {
-  getPendingBlocks: async (skip = 0, limit = 20) => {
-    const response = await api.get('/moderation/pending', {
-      params: { skip, limit },
-    })
+  getPendingBlocks: async (
+    params: {
+      cursor?: string
+      limit?: number
+      category?: string
+      provider?: string
+      min_confidence?: number
+    } = {}
+  ) => {
+    const response = await api.get('/moderation/pending', { params })
     return response.data
   },
 